@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Load-generating benchmark for both MCP servers.
+Starts mcp_stdio_server.py over pipes and mcp_http_server.py on localhost,
+drives every tool and resource at a configurable concurrency, and reports
+throughput, p50/p95/p99 latency and the peak RSS of the server process.
+With --startup it also measures cold start: the time from spawning a fresh
+server to its initialize and tools/list responses.
+Results can be saved as a baseline and later runs fail if they regress.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import psutil
+from fastmcp import Client
+from fastmcp.client.transports import PythonStdioTransport
+from mcp.types import LATEST_PROTOCOL_VERSION
+
+HERE = Path(__file__).resolve().parent
+
+
+class RSSMonitor:
+    """Polls the RSS of this process's children and remembers the peak."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-monitor", daemon=True)
+
+    def _run(self) -> None:
+        me = psutil.Process()
+        while not self._stop.wait(self.interval):
+            total = 0
+            for child in me.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+            self.peak = max(self.peak, total)
+
+    def __enter__(self) -> "RSSMonitor":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+async def run_operation(call: Callable, requests: int, concurrency: int, warmup: int) -> Dict[str, Any]:
+    """
+    Issue one operation `requests` times with up to `concurrency` in flight.
+
+    Returns:
+        Throughput, latency percentiles (milliseconds) and error count
+    """
+    for _ in range(warmup):
+        try:
+            await call()
+        except Exception:
+            pass
+
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                failed = await call()
+            except Exception:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += bool(failed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(concurrency, 1))))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    """Throughput, latency percentiles (milliseconds) and error count of a run."""
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+INITIALIZE = {
+    "jsonrpc": "2.0", "id": 1, "method": "initialize",
+    "params": {
+        "protocolVersion": LATEST_PROTOCOL_VERSION,
+        "capabilities": {},
+        "clientInfo": {"name": "benchmark_servers", "version": "1.0"},
+    },
+}
+INITIALIZED = {"jsonrpc": "2.0", "method": "notifications/initialized"}
+TOOLS_LIST = {"jsonrpc": "2.0", "id": 2, "method": "tools/list"}
+
+
+async def read_reply(stream: asyncio.StreamReader, request_id: int) -> Dict[str, Any]:
+    """Read JSON-RPC messages from a stdio server until the reply to request_id."""
+    while True:
+        line = await stream.readline()
+        if not line:
+            raise RuntimeError("server exited before replying")
+        message = json.loads(line)
+        if message.get("id") == request_id:
+            return message
+
+
+def stdio_environment(workdir: str) -> Dict[str, str]:
+    """Environment for a stdio server that keeps its file index inside workdir."""
+    return dict(os.environ, MCP_INDEX_PATH=os.path.join(workdir, ".mcp_index.json"))
+
+
+async def stdio_cold_start(workdir: str) -> Tuple[float, float]:
+    """
+    Spawn a fresh stdio server and time its first responses.
+
+    Returns:
+        Seconds from spawn to the initialize reply and to the tools/list reply
+    """
+    started = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, str(HERE / "mcp_stdio_server.py"), cwd=workdir, env=stdio_environment(workdir),
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    try:
+        proc.stdin.write(json.dumps(INITIALIZE).encode() + b"\n")
+        await read_reply(proc.stdout, 1)
+        initialized = time.perf_counter() - started
+        proc.stdin.write(json.dumps(INITIALIZED).encode() + b"\n")
+        proc.stdin.write(json.dumps(TOOLS_LIST).encode() + b"\n")
+        await read_reply(proc.stdout, 2)
+        return initialized, time.perf_counter() - started
+    finally:
+        proc.stdin.close()
+        try:
+            await asyncio.wait_for(proc.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+
+
+async def post_rpc(client: httpx.AsyncClient, url: str, message: Dict[str, Any]) -> Dict[str, Any]:
+    """POST one JSON-RPC message to a streamable HTTP server and parse the reply."""
+    response = await client.post(url, json=message, headers={"Accept": "application/json, text/event-stream"})
+    response.raise_for_status()
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        for line in response.text.splitlines():
+            if line.startswith("data:"):
+                return json.loads(line[5:])
+        raise RuntimeError("empty event stream")
+    return response.json()
+
+
+async def http_cold_start(port: int) -> Tuple[float, float]:
+    """
+    Spawn a fresh HTTP server and time its first responses.
+
+    Returns:
+        Seconds from spawn to the initialize reply and to the tools/list reply
+    """
+    env = dict(os.environ, FASTMCP_PORT=str(port), FASTMCP_LOG_LEVEL="WARNING")
+    url = f"http://127.0.0.1:{port}/mcp/"
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, str(HERE / "mcp_http_server.py")], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        async with httpx.AsyncClient(timeout=10) as client:
+            while True:
+                try:
+                    await post_rpc(client, url, INITIALIZE)
+                    break
+                except httpx.TransportError:
+                    if server.poll() is not None or time.perf_counter() - started > 30:
+                        raise RuntimeError("HTTP server did not start")
+                    await asyncio.sleep(0.01)
+            initialized = time.perf_counter() - started
+            await post_rpc(client, url, TOOLS_LIST)
+            return initialized, time.perf_counter() - started
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+async def bench_startup(cold_start: Callable, runs: int) -> Dict[str, Any]:
+    """Run cold starts one after another and summarize both milestones."""
+    timings: Dict[str, List[float]] = {"startup: initialize": [], "startup: tools/list": []}
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(runs):
+        try:
+            initialized, listed = await cold_start()
+        except Exception:
+            errors += 1
+            continue
+        timings["startup: initialize"].append(initialized)
+        timings["startup: tools/list"].append(listed)
+    elapsed = time.perf_counter() - started
+    return {name: summarize(values, errors, elapsed) for name, values in timings.items()}
+
+
+def tool_call(client: Client, name: str, arguments: Dict[str, Any]) -> Callable:
+    async def call() -> bool:
+        result = await client.call_tool_mcp(name, arguments)
+        text = "".join(getattr(block, "text", "") for block in result.content)
+        return result.isError or text.startswith("Error")
+    return call
+
+
+def resource_read(client: Client, uri: str) -> Callable:
+    async def call() -> bool:
+        await client.read_resource(uri)
+        return False
+    return call
+
+
+def stdio_operations(client: Client, workdir: Path) -> List[Tuple[str, Callable]]:
+    sample = workdir / "sample.txt"
+    sample.write_text("benchmark line\n" * 2000)
+    edited = workdir / "edited.txt"
+    edited.write_text("benchmark line\n" * 200)
+    for i in range(200):
+        (workdir / f"entry_{i:03d}.txt").write_text(str(i))
+    entries = [str(workdir / f"entry_{i:03d}.txt") for i in range(20)]
+    return [
+        ("read_file", tool_call(client, "read_file", {"file_path": str(sample)})),
+        ("read_files", tool_call(client, "read_files", {"paths": entries})),
+        ("stat_files", tool_call(client, "stat_files", {"paths": entries})),
+        ("write_file", tool_call(client, "write_file", {"file_path": str(workdir / "out.txt"), "content": "x" * 4096})),
+        ("edit_file", tool_call(client, "edit_file", {"file_path": str(edited), "start_line": 100, "end_line": 100,
+                                                      "new_text": "edited line\n"})),
+        ("list_directory", tool_call(client, "list_directory", {"directory_path": str(workdir)})),
+        ("search_files", tool_call(client, "search_files", {"pattern": "entry_1*"})),
+        ("search_content", tool_call(client, "search_content", {"pattern": "benchmark", "directory_path": str(workdir)})),
+        ("file_fingerprint", tool_call(client, "file_fingerprint", {"file_path": str(sample)})),
+        ("file://", resource_read(client, f"file://{sample}")),
+    ]
+
+
+def http_operations(client: Client) -> List[Tuple[str, Callable]]:
+    return [
+        ("get_system_info", tool_call(client, "get_system_info", {})),
+        ("get_running_processes", tool_call(client, "get_running_processes", {"limit": 10})),
+        ("find_processes", tool_call(client, "find_processes", {"name": "python"})),
+        ("get_process_details", tool_call(client, "get_process_details", {"pid": os.getpid()})),
+        ("get_network_info", tool_call(client, "get_network_info", {})),
+        # uptime is answered in-process and cached; ls is neither, so it spawns every time
+        ("execute_command", tool_call(client, "execute_command", {"command": "uptime"})),
+        ("execute_command_spawn", tool_call(client, "execute_command", {"command": "ls -la /tmp"})),
+        ("get_metrics_history", tool_call(client, "get_metrics_history", {"window_seconds": 60})),
+        ("system://info", resource_read(client, "system://info")),
+        ("system://stats", resource_read(client, "system://stats")),
+        ("system://history", resource_read(client, "system://history")),
+    ]
+
+
+async def bench_stdio(args: argparse.Namespace) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmp, RSSMonitor() as rss:
+        if args.requests:
+            transport = PythonStdioTransport(str(HERE / "mcp_stdio_server.py"), cwd=tmp, env=stdio_environment(tmp))
+            async with Client(transport) as client:
+                for name, call in stdio_operations(client, Path(tmp)):
+                    if args.only and name not in args.only:
+                        continue
+                    results[name] = await run_operation(call, args.requests, args.concurrency, args.warmup)
+        if args.startup:
+            results.update(await bench_startup(lambda: stdio_cold_start(tmp), args.startup))
+        results["peak_rss_mb"] = round(rss.peak / (1024**2), 1)
+    return results
+
+
+def wait_for_port(port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"HTTP server did not start listening on port {port}")
+
+
+async def bench_http(args: argparse.Namespace) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    with RSSMonitor() as rss:
+        if args.startup:
+            results.update(await bench_startup(lambda: http_cold_start(args.port), args.startup))
+        if args.requests:
+            results.update(await bench_http_load(args))
+        results["peak_rss_mb"] = round(rss.peak / (1024**2), 1)
+    return results
+
+
+async def bench_http_load(args: argparse.Namespace) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    env = dict(os.environ, FASTMCP_PORT=str(args.port), FASTMCP_LOG_LEVEL="WARNING")
+    server = subprocess.Popen(
+        [sys.executable, str(HERE / "mcp_http_server.py")],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(args.port, timeout=30)
+        async with Client(f"http://127.0.0.1:{args.port}/mcp/") as client:
+            for name, call in http_operations(client):
+                if args.only and name not in args.only:
+                    continue
+                results[name] = await run_operation(call, args.requests, args.concurrency, args.warmup)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float,
+            rss_tolerance: float) -> List[str]:
+    """
+    Compare a run against a baseline.
+
+    Returns:
+        One message per operation whose p95 latency grew, or throughput
+        dropped, by more than the tolerance, or that failed more often, and
+        one per server whose peak RSS grew by more than the RSS tolerance
+    """
+    regressions = []
+    for server, operations in results.items():
+        rss, rss_before = operations.get("peak_rss_mb"), baseline.get(server, {}).get("peak_rss_mb")
+        if rss and rss_before and rss > rss_before * (1 + rss_tolerance):
+            regressions.append(f"{server}: peak RSS {rss_before} MB -> {rss} MB")
+        for name, current in operations.items():
+            before = baseline.get(server, {}).get(name)
+            if not isinstance(current, dict) or not isinstance(before, dict):
+                continue
+            if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{server}/{name}: p95 {before['p95_ms']}ms -> {current['p95_ms']}ms")
+            if current["throughput"] < before["throughput"] * (1 - tolerance):
+                regressions.append(f"{server}/{name}: throughput {before['throughput']}/s -> {current['throughput']}/s")
+            if current["errors"] > before["errors"]:
+                regressions.append(f"{server}/{name}: errors {before['errors']} -> {current['errors']}")
+    return regressions
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    for server, operations in results.items():
+        print(f"\n{server.upper()} server (peak RSS {operations.get('peak_rss_mb', 0)} MB)")
+        print(f"{'Operation':<24} {'Req':>6} {'Err':>5} {'Req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        print("-" * 78)
+        for name, stats in operations.items():
+            if not isinstance(stats, dict):
+                continue
+            print(f"{name:<24} {stats['requests']:>6} {stats['errors']:>5} {stats['throughput']:>10.1f} "
+                  f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=["stdio", "http", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight per operation")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per operation (0 skips the load test)")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per operation")
+    parser.add_argument("--startup", type=int, default=0, metavar="RUNS",
+                        help="also time RUNS cold starts to initialize and tools/list")
+    parser.add_argument("--port", type=int, default=8765, help="port for the HTTP server")
+    parser.add_argument("--only", nargs="*", help="operations to run (default: all)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--save-baseline", help="write the results as a new baseline file")
+    parser.add_argument("--baseline", help="compare against this baseline file and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed p95/throughput change before a run fails (default: 0.25)")
+    parser.add_argument("--rss-tolerance", type=float, default=0.25,
+                        help="allowed peak RSS growth before a run fails (default: 0.25)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results: Dict[str, Any] = {}
+    if args.server in ("stdio", "both"):
+        results["stdio"] = asyncio.run(bench_stdio(args))
+    if args.server in ("http", "both"):
+        results["http"] = asyncio.run(bench_http(args))
+
+    print_report(results)
+    for path in filter(None, [args.output, args.save_baseline]):
+        Path(path).write_text(json.dumps(results, indent=2))
+        print(f"\nResults written to {path}")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()),
+                              args.tolerance, args.rss_tolerance)
+        if regressions:
+            print("\n❌ Regressions against baseline:")
+            for message in regressions:
+                print(f"  • {message}")
+            return 1
+        print("\n✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,72 +1,153 @@
 #!/usr/bin/env python3
 """
-Script to remove excessive indentation from all <pre><code> blocks in the HTML file.
+Script to remove excessive indentation from all <pre><code> blocks in HTML files.
+
+Usage:
+    python fix_indentation.py                    # index.html next to this script
+    python fix_indentation.py docs/**/*.html     # many files or globs, in parallel
+    python fix_indentation.py --check site/*.html  # exit 1 if any file would change
 """
 
+import argparse
+import functools
+import glob
+import os
 import re
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# <pre><code ...>...</code></pre> blocks
+BLOCK_PATTERN = re.compile(r'(<pre><code[^>]*>)(.*?)(</code></pre>)', re.DOTALL)
+# Leading whitespace of every line that has content
+INDENT_PATTERN = re.compile(r'^([^\S\n]*)\S', re.MULTILINE)
+# Whitespace-only lines
+BLANK_PATTERN = re.compile(r'^[^\S\n]+$', re.MULTILINE)
+
+
+@functools.lru_cache(maxsize=None)
+def dedent_pattern(indent: int) -> re.Pattern:
+    """
+    Pattern that empties whitespace-only lines and strips `indent` leading
+    whitespace characters from every other line, in one pass.
+    """
+    return re.compile(r'^[^\S\n]+$|^[^\S\n]{%d}' % indent, re.MULTILINE)
+
+
+def fix_block(match: re.Match) -> str:
+    """
+    Remove the common leading whitespace of one <pre><code> block.
+    """
+    opening_tag, code_content, closing_tag = match.groups()
+    indents = [len(m.group(1)) for m in INDENT_PATTERN.finditer(code_content)]
+    if not indents:
+        return match.group(0)
+
+    min_indent = min(indents)
+    if min_indent:
+        code_content = dedent_pattern(min_indent).sub('', code_content)
+    else:
+        code_content = BLANK_PATTERN.sub('', code_content)
+    return opening_tag + code_content + closing_tag
+
 
-def fix_pre_block_indentation(content):
+def fix_pre_block_indentation(content: str) -> str:
     """
     Fix indentation in all <pre><code> blocks by removing excessive leading whitespace.
     """
-    # Pattern to match <pre><code>...</code></pre> blocks
-    pattern = r'(<pre><code[^>]*>)(.*?)(</code></pre>)'
-    
-    def fix_block(match):
-        opening_tag = match.group(1)
-        code_content = match.group(2)
-        closing_tag = match.group(3)
-        
-        # Split into lines
-        lines = code_content.split('\n')
-        
-        # Filter out empty lines for indentation calculation
-        non_empty_lines = [line for line in lines if line.strip()]
-        
-        if not non_empty_lines:
-            return opening_tag + code_content + closing_tag
-        
-        # Find minimum indentation (excluding empty lines)
-        min_indent = float('inf')
-        for line in non_empty_lines:
-            if line.strip():  # Skip empty lines
-                indent = len(line) - len(line.lstrip())
-                min_indent = min(min_indent, indent)
-        
-        # If no indentation found, return as is
-        if min_indent == float('inf'):
-            min_indent = 0
-        
-        # Remove the minimum indentation from all lines
-        fixed_lines = []
-        for line in lines:
-            if line.strip():  # Non-empty line
-                fixed_lines.append(line[min_indent:] if len(line) >= min_indent else line)
-            else:  # Empty line
-                fixed_lines.append('')
-        
-        fixed_content = '\n'.join(fixed_lines)
-        return opening_tag + fixed_content + closing_tag
-    
-    # Apply the fix to all pre blocks
-    return re.sub(pattern, fix_block, content, flags=re.DOTALL)
-
-def main():
-    input_file = '/Users/kumarshubham/work/tech-talks/17-july-2025-mcp/index.html'
-    
-    # Read the file
-    with open(input_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Fix the indentation
-    fixed_content = fix_pre_block_indentation(content)
-    
-    # Write back to the file
-    with open(input_file, 'w', encoding='utf-8') as f:
-        f.write(fixed_content)
-    
-    print("Fixed indentation in all <pre><code> blocks!")
+    if '<pre><code' not in content:
+        return content
+    return BLOCK_PATTERN.sub(fix_block, content)
+
+
+def write_atomic(path: Path, content: str) -> None:
+    """
+    Replace a file via a temporary file in the same directory and a rename,
+    keeping its permission bits.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+        os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def process_file(path: str, check: bool) -> Tuple[str, bool, Optional[str]]:
+    """
+    Fix one file, or only report whether it needs fixing.
+
+    Returns:
+        (path, whether the file changed or would change, error message or None)
+    """
+    try:
+        file_path = Path(path)
+        # newline='' keeps the file's own line endings
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            content = f.read()
+        fixed_content = fix_pre_block_indentation(content)
+        if fixed_content == content:
+            return path, False, None
+        if not check:
+            write_atomic(file_path, fixed_content)
+        return path, True, None
+    except Exception as e:
+        return path, False, str(e)
+
+
+def expand(patterns: List[str]) -> List[str]:
+    """
+    Turn file names and globs (** included) into a sorted list of files.
+    """
+    files = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]
+        files.update(match for match in matches if not os.path.isdir(match))
+    return sorted(files)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', help='HTML files or globs (default: index.html next to this script)')
+    parser.add_argument('--check', action='store_true', help="don't write; exit 1 if any file would change")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (default: number of CPUs)')
+    args = parser.parse_args(argv)
+
+    files = expand(args.paths or [str(Path(__file__).resolve().parent / 'index.html')])
+    if not files:
+        print("No files matched", file=sys.stderr)
+        return 2
+
+    worker = functools.partial(process_file, check=args.check)
+    if args.jobs > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(files))) as pool:
+            results = list(pool.map(worker, files, chunksize=max(1, len(files) // (args.jobs * 4))))
+    else:
+        results = [worker(path) for path in files]
+
+    changed = errors = 0
+    for path, was_changed, error in results:
+        if error:
+            errors += 1
+            print(f"Error processing '{path}': {error}", file=sys.stderr)
+        elif was_changed:
+            changed += 1
+            print(f"{'Would fix' if args.check else 'Fixed'} indentation in '{path}'")
+
+    if args.check:
+        print(f"{changed} of {len(files)} files would change")
+    else:
+        print(f"Fixed indentation in all <pre><code> blocks! ({changed} of {len(files)} files changed)")
+    if errors:
+        return 2
+    return 1 if args.check and changed else 0
+
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Helpers shared by the MCP servers.
+Provides the bounded thread pool that blocking tool and resource bodies run
+on, so a slow handler does not stall the event loop.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads that run blocking tool bodies, so a slow read, a huge listing or a
+# psutil scan does not hold up the other requests
+TOOL_THREADS = int(os.environ.get("MCP_TOOL_THREADS", str(min(32, (os.cpu_count() or 1) + 4))))
+
+tool_pool = ThreadPoolExecutor(max_workers=TOOL_THREADS, thread_name_prefix="mcp-tool")
+
+
+def offload(func):
+    """
+    Run a blocking tool or resource body on the bounded tool thread pool.
+
+    The wrapper is a coroutine function with the same signature, so FastMCP
+    awaits it instead of calling the blocking body on the event loop, and
+    independent requests complete in whatever order they finish.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(tool_pool, functools.partial(func, *args, **kwargs))
+    return wrapper
@@ -5,192 +5,1914 @@ This server exposes system information tools via HTTP transport.
 """
 
 import asyncio
+import atexit
+import codecs
+import functools
+import heapq
+import importlib
+import math
 import json
+import os
 import platform
-import psutil
+import re
+import shlex
+import shutil
+import signal
 import socket
-import subprocess
+import struct
 import sys
+import tempfile
+import threading
+import time
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
 
-from fastmcp import settings
-from mcp.server.fastmcp import FastMCP
+from mcp import types
+from mcp.server.fastmcp import Context, FastMCP
+
+from mcp_common import offload, tool_pool
+from mcp_metrics import REGISTRY, install_profiler_toggle, instrument, profiler
+
+
+class LazyModule:
+    """
+    Module imported on first attribute access instead of now.
+
+    Keeps heavy dependencies off the startup path until a tool needs them.
+    The first access can come from the sampler thread and a tool thread at
+    once; importlib.util.LazyLoader lets both run the module body there
+    (and one may see it half-initialized), so the import is done under a
+    lock. Attributes are copied onto the proxy as they are used, so later
+    lookups skip __getattr__.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr: str) -> Any:
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+                module = self._module
+        value = getattr(module, attr)
+        setattr(self, attr, value)
+        return value
+
+
+psutil = LazyModule("psutil")
 
 # Create an MCP server with HTTP transport configuration
 mcp = FastMCP("SystemInfoServer", stateless_http=True, settings={})
 
-@mcp.tool()
-def get_system_info() -> str:
+# How often the background sampler wakes up to refresh its snapshot (seconds)
+SAMPLER_INTERVAL = float(os.environ.get("MCP_SAMPLER_INTERVAL", "1.0"))
+
+# Time-to-live of each dynamic field group (seconds). A group is re-read only
+# once its TTL has expired; override with e.g. MCP_SNAPSHOT_TTL_DISK=30
+SNAPSHOT_TTLS = {
+    group: float(os.environ.get(f"MCP_SNAPSHOT_TTL_{group.upper()}", default))
+    for group, default in {
+        "cpu": SAMPLER_INTERVAL,
+        "cpu_freq": 5.0,
+        "memory": SAMPLER_INTERVAL,
+        "disk": 5.0,
+        "net_io": SAMPLER_INTERVAL,
+    }.items()
+}
+
+
+@functools.lru_cache(maxsize=None)
+def host_facts() -> Dict[str, Any]:
+    """Host facts that cannot change while the server is running, collected on first use."""
+    return {
+        "system": {
+            "platform": platform.platform(),
+            "system": platform.system(),
+            "release": platform.release(),
+            "version": platform.version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "architecture": platform.architecture(),
+            "hostname": socket.gethostname(),
+            "boot_time": datetime.fromtimestamp(psutil.boot_time()).isoformat()
+        },
+        "python": {
+            "version": sys.version,
+            "executable": sys.executable,
+            "platform": sys.platform,
+            "implementation": platform.python_implementation(),
+            "compiler": platform.python_compiler()
+        },
+        "cpu": {
+            "physical_cores": psutil.cpu_count(logical=False),
+            "logical_cores": psutil.cpu_count(logical=True)
+        }
+    }
+
+
+class InterfaceRateTracker:
+    """
+    Computes per-interface throughput from successive net_io_counters samples.
+
+    Each call reads psutil.net_io_counters(pernic=True) once and returns the
+    bytes/s and packets/s of every interface since the previous call.
+    """
+
+    def __init__(self):
+        self._previous = None
+
+    def __call__(self) -> Dict[str, Dict[str, float]]:
+        counters = psutil.net_io_counters(pernic=True)
+        now = time.monotonic()
+        previous, self._previous = self._previous, (counters, now)
+        rates = {}
+        for interface, current in counters.items():
+            last = previous[0].get(interface) if previous else None
+            elapsed = now - previous[1] if previous else 0
+            if last is None or elapsed <= 0:
+                rates[interface] = dict.fromkeys(
+                    ("bytes_sent", "bytes_recv", "packets_sent", "packets_recv"), 0.0
+                )
+                continue
+            rates[interface] = {
+                # Counters can wrap or reset when an interface goes down
+                field: max(getattr(current, field) - getattr(last, field), 0) / elapsed
+                for field in ("bytes_sent", "bytes_recv", "packets_sent", "packets_recv")
+            }
+        return rates
+
+
+# Number of sampler ticks kept in the metrics history ring buffer
+HISTORY_SIZE = int(os.environ.get("MCP_HISTORY_SIZE", "3600"))
+
+
+class MetricsHistory:
+    """
+    Fixed-memory ring buffer of host metric samples.
+
+    Every field is stored in its own column of HISTORY_SIZE doubles, so
+    memory use is constant (8 bytes per field per slot) no matter how long
+    the server runs. The columns and the write position live in one flat
+    buffer, which may be a shared memory segment written by another process.
+    A sequence number in the buffer works as a seqlock, like the one of
+    SharedSnapshot: append() makes it odd while it writes, and query()
+    copies the slots again if it was odd or moved meanwhile.
+    """
+
+    FIELDS = ("cpu", "memory", "disk", "net_sent", "net_recv")
+
+    def __init__(self, size: int = HISTORY_SIZE, buffer=None):
+        self.size = max(size, 1)
+        if buffer is None:
+            buffer = bytearray(self.nbytes(self.size))
+        view = memoryview(buffer)
+        # Next slot to write, number of filled slots and sequence number
+        self._header = view[:24].cast('q')
+        doubles = view[24:self.nbytes(self.size)].cast('d')
+        self._timestamps = doubles[:self.size]
+        self._columns = {
+            field: doubles[(i + 1) * self.size:(i + 2) * self.size] for i, field in enumerate(self.FIELDS)
+        }
+        self._lock = threading.Lock()
+
+    @classmethod
+    def nbytes(cls, size: int) -> int:
+        """Size of the buffer backing a history of `size` slots."""
+        return 24 + 8 * size * (1 + len(cls.FIELDS))
+
+    def release(self) -> None:
+        """Drop the views of the backing buffer so shared memory can be closed."""
+        with self._lock:
+            for view in (self._header, self._timestamps, *self._columns.values()):
+                view.release()
+
+    def append(self, timestamp: float, values: Dict[str, float]) -> None:
+        """Record one sample, overwriting the oldest once the buffer is full."""
+        with self._lock:
+            seq = self._header[2]
+            self._header[2] = seq + 1
+            try:
+                slot = self._header[0]
+                self._timestamps[slot] = timestamp
+                for field, column in self._columns.items():
+                    column[slot] = values.get(field, 0.0)
+                self._header[1] = min(self._header[1] + 1, self.size)
+                self._header[0] = (slot + 1) % self.size
+            finally:
+                self._header[2] = seq + 2
+
+    def query(self, window: float = 3600, points: int = 300, fields: List[str] = None) -> Dict[str, Any]:
+        """
+        Downsample the samples of the last window seconds into time buckets.
+
+        Args:
+            window: How many seconds of history to return
+            points: Maximum number of buckets to return
+            fields: Fields to include (defaults to all FIELDS)
+
+        Returns:
+            Column-oriented buckets: bucket start times, sample counts and
+            min/avg/max of every requested field per bucket
+        """
+        fields = [field for field in (fields or self.FIELDS) if field in self._columns]
+        points = max(points, 1)
+        window = max(window, 0.001)
+        end = time.time()
+        start = end - window
+        width = window / points
+
+        with self._lock:
+            deadline = time.monotonic() + 1.0
+            while True:
+                seq = self._header[2]
+                if not seq & 1:
+                    next_slot, count = self._header[0], self._header[1]
+                    oldest = (next_slot - count) % self.size
+                    slots = [(oldest + i) % self.size for i in range(count)]
+                    slots = [slot for slot in slots if self._timestamps[slot] >= start]
+                    timestamps = [self._timestamps[slot] for slot in slots]
+                    values = {field: [self._columns[field][slot] for slot in slots] for field in fields}
+                    if self._header[2] == seq:
+                        break
+                if time.monotonic() > deadline:
+                    raise RuntimeError("Metrics history is stuck mid-update; is the collector alive?")
+
+        # bucket index -> position in the output columns
+        positions: Dict[int, int] = {}
+        result: Dict[str, Any] = {
+            "window_seconds": window,
+            "bucket_seconds": width,
+            "timestamps": [],
+            "samples": [],
+        }
+        for field in fields:
+            result[field] = {"min": [], "avg": [], "max": []}
+
+        for i, timestamp in enumerate(timestamps):
+            bucket = min(int((timestamp - start) / width), points - 1)
+            pos = positions.get(bucket)
+            if pos is None:
+                pos = positions[bucket] = len(result["timestamps"])
+                result["timestamps"].append(round(start + bucket * width, 3))
+                result["samples"].append(0)
+                for field in fields:
+                    result[field]["min"].append(math.inf)
+                    result[field]["avg"].append(0.0)
+                    result[field]["max"].append(-math.inf)
+            result["samples"][pos] += 1
+            for field in fields:
+                value = values[field][i]
+                column = result[field]
+                column["min"][pos] = min(column["min"][pos], value)
+                column["max"][pos] = max(column["max"][pos], value)
+                column["avg"][pos] += value
+
+        for field in fields:
+            column = result[field]
+            column["avg"] = [
+                round(total / count, 2) for total, count in zip(column["avg"], result["samples"])
+            ]
+            column["min"] = [round(value, 2) for value in column["min"]]
+            column["max"] = [round(value, 2) for value in column["max"]]
+        return result
+
+
+class MetricsSampler:
+    """
+    Collects CPU, memory, disk and network IO readings on a background thread.
+
+    Readers get the latest snapshot immediately instead of each paying for
+    psutil.cpu_percent(interval=1) and repeated psutil calls. Each field group
+    is refreshed in a single psutil call once its TTL expires, so a burst of
+    requests costs at most one read per group. CPU usage is the delta between
+    two consecutive "cpu" samples. Every tick is also recorded in a
+    MetricsHistory ring buffer.
+    """
+
+    def __init__(self, interval: float = SAMPLER_INTERVAL, ttls: Dict[str, float] = None,
+                 history: MetricsHistory = None):
+        self.interval = max(interval, 0.1)
+        self.ttls = dict(SNAPSHOT_TTLS if ttls is None else ttls)
+        self._interface_rates = InterfaceRateTracker()
+        self._collectors = {
+            "cpu": lambda: psutil.cpu_percent(interval=None),
+            "cpu_freq": lambda: psutil.cpu_freq(),
+            "memory": lambda: psutil.virtual_memory(),
+            "disk": lambda: psutil.disk_usage('/'),
+            "net_io": self._interface_rates,
+        }
+        # group -> (value, wall time, monotonic time); replaced, never mutated
+        self._groups: Dict[str, tuple] = {}
+        self.history = history if history is not None else MetricsHistory()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._thread = None
+
+    def _record(self) -> None:
+        groups = self._groups
+        if not all(group in groups for group in ("cpu", "memory", "disk", "net_io")):
+            return
+        net_io = groups["net_io"][0].values()
+        self.history.append(time.time(), {
+            "cpu": groups["cpu"][0],
+            "memory": groups["memory"][0].percent,
+            "disk": groups["disk"][0].percent,
+            "net_sent": sum(rates["bytes_sent"] for rates in net_io),
+            "net_recv": sum(rates["bytes_recv"] for rates in net_io),
+        })
+
+    def _refresh(self, force: bool = False) -> None:
+        now = time.monotonic()
+        groups = dict(self._groups)
+        for group, collect in self._collectors.items():
+            cached = groups.get(group)
+            if not force and cached and now - cached[2] < self.ttls.get(group, self.interval):
+                continue
+            try:
+                groups[group] = (collect(), time.time(), time.monotonic())
+            except Exception:
+                # Keep serving the last good reading; try again next tick
+                continue
+        self._groups = groups
+        self._record()
+
+    def _run(self) -> None:
+        try:
+            if not self._groups:
+                # Prime the CPU and network counters so the first reading
+                # covers a real window
+                psutil.cpu_percent(interval=None)
+                self._interface_rates()
+                self._stop.wait(0.1)
+                self._refresh(force=True)
+        finally:
+            self._ready.set()
+        while not self._stop.wait(self.interval):
+            self._refresh()
+
+    def start(self) -> None:
+        """
+        Start the sampler thread if it is not already running.
+
+        Returns immediately; the first reading is taken on the sampler
+        thread so startup is not held up by it.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="metrics-sampler", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the sampler thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get the latest snapshot, starting the sampler on first use.
+
+        Returns:
+            The latest reading of each field group, the per-group ages and
+            "timestamp"/"age_seconds" of the oldest group
+        """
+        if self._thread is None:
+            self.start()
+        self._ready.wait()
+        groups = self._groups
+        now = time.monotonic()
+        snap: Dict[str, Any] = {group: value for group, (value, _, _) in groups.items()}
+        snap["ages"] = {group: round(now - mono, 3) for group, (_, _, mono) in groups.items()}
+        oldest = min(groups.values(), key=lambda entry: entry[2])
+        snap["timestamp"] = oldest[1]
+        snap["age_seconds"] = round(now - oldest[2], 3)
+        return snap
+
+
+sampler = MetricsSampler()
+
+# How long one process table scan is reused before rescanning (seconds)
+PROCESS_TTL = float(os.environ.get("MCP_PROCESS_TTL", "1.0"))
+
+
+class ProcessTracker:
+    """
+    Long-lived process table keyed by (pid, create_time).
+
+    Process objects are kept between scans so cpu_percent() and IO rates are
+    real deltas rather than the 0.0 a fresh Process reports. Each process is
+    read inside oneshot() so its /proc files are parsed once per scan, and a
+    scan is shared by all callers for PROCESS_TTL seconds. Like
+    psutil.process_iter, a cached entry is dropped once its pid disappears.
+
+    The user and command line cost an extra /proc read each, so scans skip
+    them; find() reads them only for rows that survive the cheaper filters
+    and keeps them for the lifetime of the process.
+    """
+
+    # Sort keys accepted by top() and the row field each one ranks on
+    SORT_KEYS = {
+        "cpu": "cpu_percent",
+        "memory": "memory_percent",
+        "rss": "rss",
+        "io": "io_rate",
+    }
+
+    def __init__(self, ttl: float = PROCESS_TTL):
+        self.ttl = ttl
+        self._procs: Dict[Tuple[int, float], psutil.Process] = {}
+        self._by_pid: Dict[int, Tuple[int, float]] = {}
+        # (pid, create_time) -> (cumulative IO bytes, monotonic time)
+        self._io: Dict[Tuple[int, float], Tuple[int, float]] = {}
+        # (pid, create_time) -> (username, command line)
+        self._identities: Dict[Tuple[int, float], Tuple[Optional[str], str]] = {}
+        self._rows: List[Dict[str, Any]] = []
+        self._scanned_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _read(proc: "psutil.Process") -> Tuple[Dict[str, Any], Optional[int]]:
+        # Caller holds proc.oneshot()
+        row = {
+            "pid": proc.pid,
+            "name": proc.name(),
+            "status": proc.status(),
+            "cpu_percent": proc.cpu_percent(interval=None),
+            "rss": proc.memory_info().rss,
+        }
+        try:
+            counters = proc.io_counters()
+            io_bytes = counters.read_bytes + counters.write_bytes
+        except (psutil.AccessDenied, AttributeError):
+            io_bytes = None
+        return row, io_bytes
+
+    def _scan(self) -> None:
+        by_pid = self._by_pid
+        total_memory = psutil.virtual_memory().total
+        procs: Dict[Tuple[int, float], psutil.Process] = {}
+        io: Dict[Tuple[int, float], Tuple[int, float]] = {}
+        rows = []
+        for pid in psutil.pids():
+            key = by_pid.get(pid)
+            try:
+                row = None
+                if key is not None:
+                    proc = self._procs[key]
+                    # is_running() compares (pid, create_time) against the
+                    # process now holding the pid, so a reused pid fails it
+                    if proc.is_running():
+                        with proc.oneshot():
+                            row, io_bytes = self._read(proc)
+                if row is None:
+                    # New pid, or one reused by another process: start with
+                    # a fresh Process so it does not inherit the old baselines
+                    proc = psutil.Process(pid)
+                    key = (pid, proc.create_time())
+                    with proc.oneshot():
+                        row, io_bytes = self._read(proc)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+
+            now = time.monotonic()
+            row["memory_percent"] = row["rss"] / total_memory * 100
+            row["io_rate"] = 0.0
+            if io_bytes is not None:
+                previous = self._io.get(key)
+                if previous is not None and now > previous[1]:
+                    row["io_rate"] = max(io_bytes - previous[0], 0) / (now - previous[1])
+                io[key] = (io_bytes, now)
+            procs[key] = proc
+            rows.append(row)
+
+        self._procs = procs
+        self._by_pid = {key[0]: key for key in procs}
+        self._io = io
+        self._identities = {key: value for key, value in self._identities.items() if key in procs}
+        self._rows = rows
+        self._scanned_at = time.monotonic()
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """
+        Get the latest per-process rows, rescanning if they are older than the TTL.
+
+        Returns:
+            One dict per process with pid, name, status, cpu_percent,
+            memory_percent, rss and io_rate (bytes/s)
+        """
+        with self._lock:
+            if self._scanned_at is None:
+                # The first scan only primes the CPU/IO counters
+                self._scan()
+                time.sleep(0.1)
+                self._scan()
+            elif time.monotonic() - self._scanned_at >= self.ttl:
+                self._scan()
+            return self._rows
+
+    def top(self, limit: int, sort_by: str = "cpu") -> List[Dict[str, Any]]:
+        """
+        Select the top processes without sorting the whole table.
+
+        Args:
+            limit: Number of processes to return
+            sort_by: One of SORT_KEYS (cpu, memory, rss, io)
+
+        Returns:
+            Up to limit rows, highest first
+        """
+        field = self.SORT_KEYS[sort_by]
+        return heapq.nlargest(limit, self.rows(), key=lambda row: row[field])
+
+    def latest(self, pid: int) -> Optional[Dict[str, Any]]:
+        """Get the row of a process from the last scan, without rescanning."""
+        return next((row for row in self._rows if row["pid"] == pid), None)
+
+    def _process(self, key: Tuple[int, float]) -> "psutil.Process":
+        return self._procs[key]
+
+    def _identity(self, pid: int) -> Optional[Tuple[Optional[str], str]]:
+        # Caller holds self._lock. None if the process exited since the scan.
+        key = self._by_pid.get(pid)
+        if key is None:
+            return None
+        identity = self._identities.get(key)
+        if identity is None:
+            try:
+                info = self._process(key).as_dict(attrs=["username", "cmdline"], ad_value=None)
+            except psutil.NoSuchProcess:
+                return None
+            identity = self._identities[key] = (info["username"], " ".join(info["cmdline"] or ()))
+        return identity
+
+    def find(self, name: Optional[re.Pattern] = None, cmdline: Optional[re.Pattern] = None, user: str = None,
+             pids: List[int] = None, status: str = None, min_cpu: float = 0.0, min_rss: int = 0,
+             sort_by: str = "cpu", limit: int = 50) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Filter the process table, cheapest checks first.
+
+        Pid, status, CPU, RSS and name are checked against the scanned rows;
+        the user and command line are read only for processes that pass
+        those, and only the top `limit` matches are copied into the result.
+
+        Args:
+            name: Pattern searched for in the process name
+            cmdline: Pattern searched for in the space-joined command line
+            user: Exact user name
+            pids: Only these process ids
+            status: Exact psutil status, e.g. running, sleeping, zombie
+            min_cpu: Minimum CPU percent
+            min_rss: Minimum resident set size in bytes
+            sort_by: One of SORT_KEYS (cpu, memory, rss, io)
+            limit: Number of rows to return
+
+        Returns:
+            (number of matching processes, up to limit rows with user and
+            cmdline added, highest first)
+        """
+        field = self.SORT_KEYS[sort_by]
+        pids = set(pids) if pids else None
+        candidates = [
+            row for row in self.rows()
+            if (pids is None or row["pid"] in pids)
+            and (status is None or row["status"] == status)
+            and row["cpu_percent"] >= min_cpu
+            and row["rss"] >= min_rss
+            and (name is None or name.search(row["name"]))
+        ]
+        with self._lock:
+            if user is not None or cmdline is not None:
+                matches = []
+                for row in candidates:
+                    identity = self._identity(row["pid"])
+                    if identity is None or (user is not None and identity[0] != user):
+                        continue
+                    if cmdline is None or cmdline.search(identity[1]):
+                        matches.append(row)
+                candidates = matches
+            results = []
+            for row in heapq.nlargest(limit, candidates, key=lambda row: row[field]):
+                username, command = self._identity(row["pid"]) or (None, "")
+                results.append({**row, "user": username, "cmdline": command})
+        return len(candidates), results
+
+
+process_tracker = ProcessTracker()
+
+# How long one socket enumeration is shared between callers (seconds)
+CONNECTIONS_TTL = float(os.environ.get("MCP_CONNECTIONS_TTL", "2.0"))
+
+
+class ConnectionStats:
+    """
+    Counts sockets by protocol and TCP state in one net_connections() pass.
+
+    The counts are cached for CONNECTIONS_TTL seconds and concurrent callers
+    wait for a single in-flight enumeration instead of starting their own.
+    """
+
+    def __init__(self, ttl: float = CONNECTIONS_TTL):
+        self.ttl = ttl
+        self._counts: Dict[str, Any] = {}
+        self._counted_at = None
+        self._lock = threading.Lock()
+
+    def _count(self) -> Dict[str, Any]:
+        tcp_states = Counter()
+        udp = 0
+        for conn in psutil.net_connections(kind='inet'):
+            if conn.type == socket.SOCK_STREAM:
+                tcp_states[conn.status] += 1
+            else:
+                udp += 1
+        tcp = sum(tcp_states.values())
+        return {
+            "total": tcp + udp,
+            "tcp": tcp,
+            "udp": udp,
+            "tcp_states": dict(tcp_states.most_common()),
+        }
+
+    def counts(self) -> Dict[str, Any]:
+        """
+        Get the socket counts, re-enumerating if they are older than the TTL.
+
+        Returns:
+            Total, TCP and UDP socket counts, TCP counts per state and the
+            age of the enumeration in seconds
+        """
+        with self._lock:
+            if self._counted_at is None or time.monotonic() - self._counted_at >= self.ttl:
+                self._counts = self._count()
+                self._counted_at = time.monotonic()
+            return {**self._counts, "age_seconds": round(time.monotonic() - self._counted_at, 3)}
+
+
+connection_stats = ConnectionStats()
+
+# With MCP_WORKERS, one collector process samples the host and publishes the
+# readings in shared memory for all workers (set to 0 to sample per worker)
+SHARED_SNAPSHOT = os.environ.get("MCP_SHARED_SNAPSHOT", "1").lower() not in ("0", "false", "no")
+# Rows of the shared process table; on hosts with more processes the
+# highest-CPU ones are kept
+SHM_MAX_PROCESSES = int(os.environ.get("MCP_SHM_MAX_PROCESSES", "8192"))
+SHM_MAX_INTERFACES = 64
+# Environment variable that hands the segment name to the worker processes
+SNAPSHOT_SHM_ENV = "MCP_SNAPSHOT_SHM"
+# Environment variable that hands the workers the directory of their metrics files
+METRICS_DIR_ENV = "MCP_METRICS_DIR"
+# Seconds between collector checks for requests and readings to publish
+COLLECTOR_POLL = 0.05
+# The collector stops scanning processes/connections nobody asked for in this long
+COLLECTOR_IDLE_AFTER = 60.0
+# Seconds a worker waits for the collector before giving up on a reading
+SHARED_WAIT_TIMEOUT = 5.0
+
+# Fixed code tables of the shared layout; changing them needs a new VERSION
+TCP_STATES = (
+    "ESTABLISHED", "SYN_SENT", "SYN_RECV", "FIN_WAIT1", "FIN_WAIT2", "TIME_WAIT",
+    "CLOSE", "CLOSE_WAIT", "LAST_ACK", "LISTEN", "CLOSING", "NONE",
+)
+PROCESS_STATUSES = (
+    "running", "sleeping", "disk-sleep", "stopped", "tracing-stop", "zombie", "dead",
+    "wake-kill", "waking", "idle", "locked", "waiting", "suspended", "parked",
+)
+NET_RATES = ("bytes_sent", "bytes_recv", "packets_sent", "packets_recv")
+
+
+class CpuFreqReading(NamedTuple):
+    current: float
+
+
+class MemoryReading(NamedTuple):
+    total: int
+    available: int
+    used: int
+    percent: float
+
+
+class DiskReading(NamedTuple):
+    total: int
+    used: int
+    free: int
+    percent: float
+
+
+class SharedSnapshot:
+    """
+    Host readings in a shared memory segment with a fixed, versioned layout.
+
+    A single collector process writes the sampler groups, the process table
+    and the socket counts; worker processes unpack them straight from the
+    segment with struct, with no pickling or IPC round trip. The sequence
+    number works as a seqlock: the writer makes it odd while it writes and
+    even when done, and readers retry when it was odd or moved while they
+    read. The metrics history ring buffer lives in the same segment.
+
+    Readers mark process and connection data as wanted; the collector only
+    scans them while someone asked within COLLECTOR_IDLE_AFTER seconds.
+
+    Layout, little-endian:
+        HEADER      magic, version, seq, table capacities, wanted times
+        SYSTEM      per-group times, readings, table sizes, socket counts
+        INTERFACE   x max_interfaces
+        PROCESS     x max_processes
+        history     MetricsHistory.nbytes(history_size)
+    """
+
+    MAGIC = b"MCPS"
+    VERSION = 2
+    # magic, version, seq, max_processes, max_interfaces, history_size,
+    # processes wanted, connections wanted (monotonic seconds)
+    HEADER = struct.Struct("<4sH2xQIII4xdd")
+    SEQ_OFFSET = 8
+    WANTED_OFFSETS = {"processes": 32, "connections": 40}
+    # (wall, monotonic) per MetricsSampler group, cpu, cpu_freq, memory,
+    # disk, interface/process/total process counts, process and connection
+    # publish times (monotonic), socket total/tcp/udp and per TCP state
+    SYSTEM = struct.Struct("<10d2d3Qd3QdIII4x2d3Q12Q")
+    GROUPS = ("cpu", "cpu_freq", "memory", "disk", "net_io")
+    INTERFACE = struct.Struct("<32s4d")
+    # pid, create_time, cpu_percent, memory_percent, rss, io_rate, status, name
+    PROCESS = struct.Struct("<IdddQdB64s")
+
+    def __init__(self, shm):
+        self._shm = shm
+        self._buf = shm.buf
+        magic, version, _, self.max_processes, self.max_interfaces, history_size, _, _ = \
+            self.HEADER.unpack_from(self._buf)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"Shared snapshot '{shm.name}' has an unknown layout ({magic!r} v{version})")
+        self._system_at = self.HEADER.size
+        self._interfaces_at = self._system_at + self.SYSTEM.size
+        self._processes_at = self._interfaces_at + self.INTERFACE.size * self.max_interfaces
+        history_at = self._processes_at + self.PROCESS.size * self.max_processes
+        self.history = MetricsHistory(
+            history_size, self._buf[history_at:history_at + MetricsHistory.nbytes(history_size)]
+        )
+
+    @classmethod
+    def size(cls, max_processes: int, max_interfaces: int, history_size: int) -> int:
+        """Bytes needed by a segment with these capacities."""
+        return (cls.HEADER.size + cls.SYSTEM.size + cls.INTERFACE.size * max_interfaces
+                + cls.PROCESS.size * max_processes + MetricsHistory.nbytes(history_size))
+
+    @classmethod
+    def create(cls, max_processes: int = SHM_MAX_PROCESSES, max_interfaces: int = SHM_MAX_INTERFACES,
+               history_size: int = HISTORY_SIZE) -> "SharedSnapshot":
+        """Create a new, empty segment; the caller owns it and must unlink() it."""
+        from multiprocessing import shared_memory
+
+        history_size = max(history_size, 1)
+        shm = shared_memory.SharedMemory(
+            create=True, size=cls.size(max_processes, max_interfaces, history_size)
+        )
+        cls.HEADER.pack_into(shm.buf, 0, cls.MAGIC, cls.VERSION, 0,
+                             max_processes, max_interfaces, history_size, 0.0, 0.0)
+        return cls(shm)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedSnapshot":
+        """Open a segment created by another process."""
+        from multiprocessing import shared_memory
+
+        return cls(shared_memory.SharedMemory(name=name))
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def close(self) -> None:
+        if self._buf is not None:
+            self.history.release()
+            self._buf = None
+            self._shm.close()
+
+    def unlink(self) -> None:
+        self._shm.unlink()
+
+    def want(self, kind: str) -> None:
+        """Ask the collector to keep publishing "processes" or "connections"."""
+        struct.pack_into("<d", self._buf, self.WANTED_OFFSETS[kind], time.monotonic())
+
+    def wanted(self, kind: str) -> float:
+        """Monotonic time a reader last asked for this kind of data (0 if never)."""
+        return struct.unpack_from("<d", self._buf, self.WANTED_OFFSETS[kind])[0]
+
+    def _seq(self) -> int:
+        return struct.unpack_from("<Q", self._buf, self.SEQ_OFFSET)[0]
+
+    def _read(self, unpack: Callable[[], Any]) -> Any:
+        deadline = time.monotonic() + 1.0
+        while True:
+            before = self._seq()
+            if not before & 1:
+                value = unpack()
+                if self._seq() == before:
+                    return value
+            if time.monotonic() > deadline:
+                raise RuntimeError("Shared snapshot is stuck mid-update; is the collector alive?")
+
+    def _system(self) -> tuple:
+        return self.SYSTEM.unpack_from(self._buf, self._system_at)
+
+    def publish(self, snap: Dict[str, Any] = None, processes: List[Dict[str, Any]] = None,
+                connections: Dict[str, Any] = None) -> None:
+        """
+        Write new readings under one sequence bump. Sections passed as None
+        keep their previous contents. Only one process may publish.
+
+        Args:
+            snap: MetricsSampler.snapshot() of the collector
+            processes: ProcessTracker rows, each with its create_time
+            connections: ConnectionStats.counts()
+        """
+        fields = list(self._system())
+        if snap is not None:
+            now_wall, now_mono = time.time(), time.monotonic()
+            for i, group in enumerate(self.GROUPS):
+                if group in snap:
+                    # Ages are relative to now; turn them back into timestamps
+                    age = snap["ages"][group]
+                    fields[2 * i:2 * i + 2] = [now_wall - age, now_mono - age]
+            cpu_freq = snap.get("cpu_freq")
+            memory, disk = snap.get("memory"), snap.get("disk")
+            fields[10] = snap.get("cpu", 0.0)
+            fields[11] = cpu_freq.current if cpu_freq else math.nan
+            if memory is not None:
+                fields[12:16] = [memory.total, memory.available, memory.used, memory.percent]
+            if disk is not None:
+                fields[16:20] = [disk.total, disk.used, disk.free, disk.percent]
+            interfaces = list(snap.get("net_io", {}).items())[:self.max_interfaces]
+            fields[20] = len(interfaces)
+        if processes is not None:
+            total = len(processes)
+            if total > self.max_processes:
+                processes = heapq.nlargest(self.max_processes, processes, key=lambda row: row["cpu_percent"])
+            fields[21:23] = [len(processes), total]
+            fields[23] = time.monotonic()
+        if connections is not None:
+            states = connections["tcp_states"]
+            fields[24] = time.monotonic()
+            fields[25:28] = [connections["total"], connections["tcp"], connections["udp"]]
+            fields[28:40] = [states.get(state, 0) for state in TCP_STATES]
+
+        seq = self._seq()
+        struct.pack_into("<Q", self._buf, self.SEQ_OFFSET, seq + 1)
+        try:
+            self.SYSTEM.pack_into(self._buf, self._system_at, *fields)
+            if snap is not None:
+                for i, (interface, rates) in enumerate(interfaces):
+                    self.INTERFACE.pack_into(
+                        self._buf, self._interfaces_at + i * self.INTERFACE.size,
+                        interface.encode("utf-8")[:32], *(rates[field] for field in NET_RATES)
+                    )
+            if processes is not None:
+                statuses = {status: code for code, status in enumerate(PROCESS_STATUSES)}
+                for i, row in enumerate(processes):
+                    self.PROCESS.pack_into(
+                        self._buf, self._processes_at + i * self.PROCESS.size,
+                        row["pid"], row["create_time"], row["cpu_percent"], row["memory_percent"],
+                        row["rss"], row["io_rate"], statuses.get(row["status"], 255),
+                        row["name"].encode("utf-8")[:64],
+                    )
+        finally:
+            struct.pack_into("<Q", self._buf, self.SEQ_OFFSET, seq + 2)
+
+    def published_at(self, kind: str) -> float:
+        """Monotonic time of the last "system", "processes" or "connections" reading (0 if none)."""
+        fields = self._read(self._system)
+        return {"system": fields[1], "processes": fields[23], "connections": fields[24]}[kind]
+
+    def wait(self, kind: str, max_age: float = math.inf, timeout: float = SHARED_WAIT_TIMEOUT) -> float:
+        """
+        Wait until the collector published a reading of `kind` at most
+        max_age seconds old; wanted kinds are requested first.
+
+        Returns:
+            Monotonic time of the reading, possibly older than max_age if
+            none arrived within the timeout
+        """
+        if kind in self.WANTED_OFFSETS:
+            self.want(kind)
+        deadline = time.monotonic() + timeout
+        while True:
+            published = self.published_at(kind)
+            if published and time.monotonic() - published <= max_age:
+                return published
+            if time.monotonic() >= deadline:
+                if published:
+                    return published
+                raise TimeoutError(f"No {kind} reading from the metrics collector after {timeout}s")
+            time.sleep(0.01)
+
+    def system(self) -> Dict[str, Any]:
+        """The collector's sampler readings, shaped like MetricsSampler.snapshot()."""
+        def unpack():
+            fields = self._system()
+            interfaces = [
+                self.INTERFACE.unpack_from(self._buf, self._interfaces_at + i * self.INTERFACE.size)
+                for i in range(fields[20])
+            ]
+            return fields, interfaces
+
+        fields, interfaces = self._read(unpack)
+        now = time.monotonic()
+        values = {
+            "cpu": fields[10],
+            "cpu_freq": None if math.isnan(fields[11]) else CpuFreqReading(fields[11]),
+            "memory": MemoryReading(*fields[12:16]),
+            "disk": DiskReading(*fields[16:20]),
+            "net_io": {
+                name.rstrip(b"\0").decode("utf-8", "ignore"): dict(zip(NET_RATES, rates))
+                for name, *rates in interfaces
+            },
+        }
+        times = {group: fields[2 * i:2 * i + 2] for i, group in enumerate(self.GROUPS) if fields[2 * i]}
+        snap: Dict[str, Any] = {group: values[group] for group in times}
+        snap["ages"] = {group: round(now - mono, 3) for group, (_, mono) in times.items()}
+        oldest = min(times.values(), key=lambda entry: entry[1])
+        snap["timestamp"] = oldest[0]
+        snap["age_seconds"] = round(now - oldest[1], 3)
+        return snap
+
+    def processes(self) -> Tuple[List[Dict[str, Any]], Dict[int, Tuple[int, float]], int, float]:
+        """
+        The collector's last process table.
+
+        Returns:
+            (rows shaped like ProcessTracker.rows(), pid -> (pid, create_time),
+            number of processes on the host, monotonic time of the scan)
+        """
+        def unpack():
+            fields = self._system()
+            count = fields[21]
+            table = self._buf[self._processes_at:self._processes_at + count * self.PROCESS.size]
+            try:
+                return list(self.PROCESS.iter_unpack(table)), fields[22], fields[23]
+            finally:
+                table.release()
+
+        records, total, scanned = self._read(unpack)
+        rows, keys = [], {}
+        for pid, create_time, cpu, memory, rss, io_rate, status, name in records:
+            keys[pid] = (pid, create_time)
+            rows.append({
+                "pid": pid,
+                "name": name.rstrip(b"\0").decode("utf-8", "ignore"),
+                "status": PROCESS_STATUSES[status] if status < len(PROCESS_STATUSES) else "unknown",
+                "cpu_percent": cpu,
+                "rss": rss,
+                "memory_percent": memory,
+                "io_rate": io_rate,
+            })
+        return rows, keys, total, scanned
+
+    def connections(self) -> Dict[str, Any]:
+        """The collector's last socket counts, shaped like ConnectionStats.counts() without the age."""
+        fields = self._read(self._system)
+        states = Counter({state: count for state, count in zip(TCP_STATES, fields[28:40]) if count})
+        return {
+            "total": fields[25],
+            "tcp": fields[26],
+            "udp": fields[27],
+            "tcp_states": dict(states.most_common()),
+        }
+
+
+class SharedMetricsSampler(MetricsSampler):
+    """MetricsSampler of a worker process that reads the collector's readings."""
+
+    def __init__(self, shared: SharedSnapshot):
+        super().__init__(history=shared.history)
+        self._shared = shared
+
+    def start(self) -> None:
+        """Nothing to start; the collector process does the sampling."""
+
+    def stop(self) -> None:
+        """Nothing to stop; the collector process does the sampling."""
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._shared.wait("system")
+        return self._shared.system()
+
+
+class SharedProcessTracker(ProcessTracker):
+    """
+    ProcessTracker of a worker process that reads the collector's scans.
+
+    The table is decoded again only when the collector published a new
+    scan. User and command line are still read here, for matching rows only.
+    """
+
+    def __init__(self, shared: SharedSnapshot, ttl: float = PROCESS_TTL):
+        super().__init__(ttl)
+        self._shared = shared
+        self._total = 0
+
+    def _sync(self) -> None:
+        scanned = self._shared.published_at("processes")
+        if scanned and scanned != self._scanned_at:
+            rows, keys, total, scanned = self._shared.processes()
+            with self._lock:
+                self._rows, self._by_pid, self._total, self._scanned_at = rows, keys, total, scanned
+                live = set(keys.values())
+                self._identities = {key: value for key, value in self._identities.items() if key in live}
+
+    def rows(self) -> List[Dict[str, Any]]:
+        # A scan is due every ttl; allow for the collector's poll and the scan itself
+        self._shared.wait("processes", max_age=self.ttl + 1.0)
+        self._sync()
+        return self._rows
+
+    def latest(self, pid: int) -> Optional[Dict[str, Any]]:
+        self._sync()
+        return super().latest(pid)
+
+    def _process(self, key: Tuple[int, float]) -> "psutil.Process":
+        proc = psutil.Process(key[0])
+        if proc.create_time() != key[1]:
+            # The pid was reused since the collector's scan
+            raise psutil.NoSuchProcess(key[0])
+        return proc
+
+
+class SharedConnectionStats(ConnectionStats):
+    """ConnectionStats of a worker process that reads the collector's counts."""
+
+    def __init__(self, shared: SharedSnapshot, ttl: float = CONNECTIONS_TTL):
+        super().__init__(ttl)
+        self._shared = shared
+
+    def counts(self) -> Dict[str, Any]:
+        counted = self._shared.wait("connections", max_age=self.ttl + 1.0)
+        return {**self._shared.connections(), "age_seconds": round(time.monotonic() - counted, 3)}
+
+
+def run_collector(name: str, parent: int) -> None:
+    """
+    Collector process: sample the host and publish into the shared segment
+    until the parent process exits or terminates it.
+
+    Process and socket scans run only while a worker asked for them within
+    COLLECTOR_IDLE_AFTER seconds, at the usual PROCESS_TTL/CONNECTIONS_TTL.
+    """
+    # Ctrl+C reaches the whole process group; the parent stops us afterwards
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    shared = SharedSnapshot.attach(name)
+    collector = MetricsSampler(history=shared.history)
+    collector.start()
+    tracker = stats = None
+    groups = None
+    scanned = counted = 0.0
+    while os.getppid() == parent:
+        now = time.monotonic()
+        snap = processes = connections = None
+        if collector._groups is not groups:
+            snap = collector.snapshot()
+            groups = collector._groups
+        if now - shared.wanted("processes") < COLLECTOR_IDLE_AFTER:
+            if tracker is None:
+                tracker = ProcessTracker()
+            if now - scanned >= tracker.ttl:
+                # Rows carry create_time so workers can tell reused pids apart
+                processes = [{**row, "create_time": tracker._by_pid[row["pid"]][1]} for row in tracker.rows()]
+                scanned = now
+        else:
+            # Start over with fresh CPU/IO baselines when asked again
+            tracker, scanned = None, 0.0
+        if now - shared.wanted("connections") < COLLECTOR_IDLE_AFTER:
+            if stats is None:
+                stats = ConnectionStats()
+            if now - counted >= stats.ttl:
+                connections = stats.counts()
+                counted = now
+        else:
+            stats, counted = None, 0.0
+        if snap is not None or processes is not None or connections is not None:
+            shared.publish(snap, processes, connections)
+        time.sleep(COLLECTOR_POLL)
+    collector.stop()
+
+# Whitelist of safe read-only commands
+SAFE_COMMANDS = frozenset([
+    'ls', 'pwd', 'whoami', 'date', 'uptime', 'df', 'free', 'ps',
+    'top', 'htop', 'netstat', 'ifconfig', 'ping', 'traceroute',
+    'cat', 'head', 'tail', 'grep', 'find', 'which', 'whereis'
+])
+
+# Characters of shell syntax that has no meaning once commands run without a shell
+SHELL_OPERATOR_CHARS = '|&;<>'
+
+# Limits for execute_command: wall time (seconds), commands running at once,
+# and how much combined stdout/stderr is kept before the command is killed
+COMMAND_TIMEOUT = float(os.environ.get("MCP_COMMAND_TIMEOUT", "10"))
+COMMAND_CONCURRENCY = int(os.environ.get("MCP_COMMAND_CONCURRENCY", "4"))
+COMMAND_MAX_BYTES = int(os.environ.get("MCP_COMMAND_MAX_BYTES", str(1024 * 1024)))
+COMMAND_MAX_LINES = int(os.environ.get("MCP_COMMAND_MAX_LINES", "10000"))
+
+# Minimum delay between two streamed progress notifications (seconds)
+PROGRESS_INTERVAL = 0.25
+
+_command_slots = asyncio.Semaphore(COMMAND_CONCURRENCY)
+
+
+class CommandRun:
+    """
+    Runs one whitelisted command as an asyncio subprocess without a shell.
+
+    stdout and stderr are read concurrently in chunks against a shared byte
+    and line budget; once the budget is spent the process is killed and the
+    output marked as truncated. New stdout is streamed to the client as MCP
+    progress notifications while the command is still running.
+    """
+
+    def __init__(self, argv: List[str], ctx: Context = None):
+        self.argv = argv
+        self.ctx = ctx
+        self.stdout = bytearray()
+        self.stderr = bytearray()
+        self.lines = 0
+        self.truncated = False
+        self.timed_out = False
+        self.returncode = None
+        self._process = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending: List[str] = []
+        self._last_progress = 0.0
+
+    def _take(self, chunk: bytes) -> bytes:
+        """Trim a chunk to what is left of the byte and line budget."""
+        room = COMMAND_MAX_BYTES - len(self.stdout) - len(self.stderr)
+        if len(chunk) > room:
+            chunk = chunk[:max(room, 0)]
+            self.truncated = True
+        newlines = chunk.count(b"\n")
+        if self.lines + newlines > COMMAND_MAX_LINES:
+            cut = -1
+            for _ in range(COMMAND_MAX_LINES - self.lines):
+                cut = chunk.index(b"\n", cut + 1)
+            chunk = chunk[:cut + 1]
+            newlines = COMMAND_MAX_LINES - self.lines
+            self.truncated = True
+        self.lines += newlines
+        return chunk
+
+    async def _progress(self, force: bool = False) -> None:
+        if self.ctx is None or not self._pending:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        message = "".join(self._pending)
+        self._pending.clear()
+        self._last_progress = now
+        try:
+            request = self.ctx.request_context
+        except ValueError:
+            # Called outside of an MCP request; nothing to stream to
+            self.ctx = None
+            return
+        token = request.meta.progressToken if request.meta else None
+        if token is None:
+            return
+        # Tie the notification to this request so the stateless HTTP
+        # transport sends it on the request's own response stream
+        await request.session.send_progress_notification(
+            token, len(self.stdout), message=message, related_request_id=self.ctx.request_id
+        )
+
+    async def _pump(self, stream: asyncio.StreamReader, sink: bytearray, stream_output: bool) -> None:
+        while True:
+            chunk = await stream.read(65536)
+            if not chunk:
+                break
+            if self.truncated:
+                continue
+            chunk = self._take(chunk)
+            sink.extend(chunk)
+            if stream_output:
+                self._pending.append(self._decoder.decode(chunk))
+                await self._progress()
+            if self.truncated:
+                self._kill()
+        if stream_output:
+            await self._progress(force=True)
+
+    def _kill(self) -> None:
+        if self._process is not None and self._process.returncode is None:
+            # Signal the pid directly: Process.kill() polls the child first,
+            # which can reap it behind the event loop's child watcher
+            try:
+                os.kill(self._process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    async def run(self) -> "CommandRun":
+        """Run the command, waiting for a free slot first."""
+        async with _command_slots:
+            self._process = await asyncio.create_subprocess_exec(
+                *self.argv,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(
+                        self._pump(self._process.stdout, self.stdout, True),
+                        self._pump(self._process.stderr, self.stderr, False),
+                        self._process.wait(),
+                    ),
+                    timeout=COMMAND_TIMEOUT,
+                )
+            except asyncio.TimeoutError:
+                self.timed_out = True
+            finally:
+                self._kill()
+                self.returncode = await self._process.wait()
+        return self
+
+
+# Seconds an idempotent command's output is reused for identical calls
+COMMAND_CACHE_TTL = float(os.environ.get("MCP_COMMAND_CACHE_TTL", "2.0"))
+
+# Commands whose output only depends on slowly changing host state
+CACHEABLE_COMMANDS = frozenset(['pwd', 'whoami', 'uptime', 'df', 'free', 'ps', 'which', 'whereis'])
+
+# Filesystem types GNU df hides unless run with -a
+DF_DUMMY_TYPES = frozenset([
+    'autofs', 'proc', 'subfs', 'debugfs', 'devpts', 'fusectl', 'mqueue',
+    'rpc_pipefs', 'sysfs', 'devfs', 'kernfs', 'ignore', 'none', 'rootfs'
+])
+
+
+def _fast_pwd(args: List[str]) -> Optional[Tuple[int, str, str]]:
+    if args:
+        return None
+    return 0, os.getcwd() + "\n", ""
+
+
+def _fast_whoami(args: List[str]) -> Optional[Tuple[int, str, str]]:
+    if args:
+        return None
+    try:
+        import pwd
+    except ImportError:
+        return None
+    return 0, pwd.getpwuid(os.geteuid()).pw_name + "\n", ""
+
+
+def _fast_date(args: List[str]) -> Optional[Tuple[int, str, str]]:
+    if args:
+        return None
+    return 0, time.strftime("%a %b %e %H:%M:%S %Z %Y") + "\n", ""
+
+
+def _fast_uptime(args: List[str]) -> Optional[Tuple[int, str, str]]:
+    # Same layout as procps-ng uptime
+    if args or not hasattr(os, "getloadavg"):
+        return None
+    now = time.time()
+    up = int(now - psutil.boot_time())
+    days, hours, minutes = up // 86400, (up // 3600) % 24, (up // 60) % 60
+    line = f" {time.strftime('%H:%M:%S', time.localtime(now))} up "
+    if days:
+        line += f"{days} {'days' if days > 1 else 'day'}, "
+    line += f"{hours:2d}:{minutes:02d}, " if hours else f"{minutes} min, "
+    users = len(psutil.users())
+    line += f"{users:2d} {'users' if users > 1 else 'user'}, "
+    line += " load average: {:.2f}, {:.2f}, {:.2f}".format(*os.getloadavg())
+    return 0, line + "\n", ""
+
+
+def _fast_free(args: List[str]) -> Optional[Tuple[int, str, str]]:
+    # Same layout and KiB values as procps-ng 4 free
+    if args:
+        return None
+    memory = psutil.virtual_memory()
+    swap = psutil.swap_memory()
+    kib = lambda value: str(value // 1024)
+    rows = [
+        ("", ["total", "used", "free", "shared", "buff/cache", "available"]),
+        ("Mem:", [kib(memory.total), kib(memory.total - memory.available), kib(memory.free),
+                  kib(memory.shared), kib(memory.buffers + memory.cached), kib(memory.available)]),
+        ("Swap:", [kib(swap.total), kib(swap.total - swap.free), kib(swap.free)]),
+    ]
+    out = "".join(f"{label:<8}" + "".join(f"{value:>12}" for value in values) + "\n" for label, values in rows)
+    return 0, out, ""
+
+
+def _human_size(value: int) -> str:
+    """Format a byte count like GNU df -h (powers of 1024, rounded up)."""
+    if value < 1024:
+        return str(value)
+    size = float(value)
+    for unit in "KMGTPEZY":
+        size /= 1024
+        if size < 10 and math.ceil(size * 10) / 10 < 10:
+            return f"{math.ceil(size * 10) / 10:.1f}{unit}"
+        if math.ceil(size) < 1024 or unit == "Y":
+            return f"{math.ceil(size)}{unit}"
+    return str(value)
+
+
+def _fast_df(args: List[str]) -> Optional[Tuple[int, str, str]]:
+    # Same filesystem selection and column layout as GNU coreutils df
+    human = args == ["-h"]
+    if args and not human:
+        return None
+    header = ["Filesystem", "Size" if human else "1K-blocks", "Used", "Avail" if human else "Available", "Use%", "Mounted on"]
+    rows = []
+    seen_devices = set()
+    for part in psutil.disk_partitions(all=True):
+        if part.fstype in DF_DUMMY_TYPES:
+            continue
+        try:
+            stat = os.statvfs(part.mountpoint)
+            device = os.stat(part.mountpoint).st_dev
+        except OSError:
+            continue
+        if stat.f_blocks == 0 or device in seen_devices:
+            continue
+        seen_devices.add(device)
+        total = stat.f_blocks * stat.f_frsize
+        used = (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+        avail = stat.f_bavail * stat.f_frsize
+        percent = f"{math.ceil(used * 100 / (used + avail))}%" if used + avail else "-"
+        fmt = _human_size if human else (lambda value: str(-(-value // 1024)))
+        rows.append([part.device, fmt(total), fmt(used), fmt(avail), percent, part.mountpoint])
+    # Columns are sized to their content with GNU's minimum widths
+    widths = [max([minimum, len(header[i])] + [len(row[i]) for row in rows])
+              for i, minimum in enumerate([14, 5, 5, 5, 4])]
+    lines = []
+    for row in [header] + rows:
+        cells = [row[0].ljust(widths[0])] + [row[i].rjust(widths[i]) for i in range(1, 5)] + [row[5]]
+        lines.append(" ".join(cells))
+    return 0, "\n".join(lines) + "\n", ""
+
+
+def _fast_ps(args: List[str]) -> Optional[Tuple[int, str, str]]:
+    # Same selection as procps ps without options: our euid and our terminal
+    if args:
+        return None
+    try:
+        with open("/proc/sys/kernel/pid_max") as f:
+            pid_width = max(len(f.read().strip()), 5)
+    except OSError:
+        pid_width = 5
+    me = psutil.Process()
+    euid = me.uids().effective
+    terminal = me.terminal()
+    lines = [f"{'PID':>{pid_width}} {'TTY':<8} {'TIME':>8} CMD"]
+    for proc in psutil.process_iter(['pid', 'name', 'uids', 'terminal', 'cpu_times']):
+        info = proc.info
+        if info['uids'] is None or info['uids'].effective != euid or info['terminal'] != terminal:
+            continue
+        cpu = info['cpu_times']
+        seconds = int(cpu.user + cpu.system) if cpu else 0
+        days, seconds = divmod(seconds, 86400)
+        cputime = f"{seconds // 3600:02d}:{(seconds // 60) % 60:02d}:{seconds % 60:02d}"
+        if days:
+            cputime = f"{days}-{cputime}"
+        tty = info['terminal'][len("/dev/"):] if info['terminal'] else "?"
+        lines.append(f"{info['pid']:>{pid_width}} {tty:<8} {cputime:>8} {info['name']}")
+    return 0, "\n".join(lines) + "\n", ""
+
+
+def _fast_which(args: List[str]) -> Optional[Tuple[int, str, str]]:
+    if not args or any(arg.startswith("-") for arg in args):
+        return None
+    found = [shutil.which(name) for name in args]
+    out = "".join(f"{path}\n" for path in found if path)
+    return (0 if all(found) else 1), out, ""
+
+
+# Commands answered in-process when called in a form the function supports;
+# each returns (exit code, stdout, stderr) or None to fall back to a subprocess
+FAST_COMMANDS = {
+    'pwd': _fast_pwd,
+    'whoami': _fast_whoami,
+    'date': _fast_date,
+    'uptime': _fast_uptime,
+    'free': _fast_free,
+    'df': _fast_df,
+    'ps': _fast_ps,
+    'which': _fast_which,
+}
+
+
+class CommandCache:
+    """Short-lived cache of command output keyed by the parsed argv."""
+
+    def __init__(self, ttl: float = COMMAND_CACHE_TTL, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[Tuple[str, ...], Tuple[float, str]] = {}
+
+    def get(self, argv: List[str]) -> Optional[str]:
+        """Get the cached output of argv if it has not expired."""
+        entry = self._entries.get(tuple(argv))
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def put(self, argv: List[str], output: str) -> None:
+        """Cache the output of argv for the TTL."""
+        if self.ttl <= 0:
+            return
+        now = time.monotonic()
+        if len(self._entries) >= self.max_entries:
+            self._entries = {key: entry for key, entry in self._entries.items() if entry[0] >= now}
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+        self._entries[tuple(argv)] = (now + self.ttl, output)
+
+
+command_cache = CommandCache()
+
+# Output formats accepted by the system tools: human-readable text (the
+# default), compact JSON with raw numbers, or MCP structured content
+OUTPUT_FORMATS = ("text", "json", "structured")
+
+SYSTEM_INFO_SECTIONS = ("system", "python", "memory", "cpu", "disk", "sample")
+NETWORK_INFO_SECTIONS = ("interfaces", "connections", "io_rates")
+
+
+def _check_output_options(format: str, sections: Optional[List[str]], known: Tuple[str, ...]) -> Optional[str]:
+    """Validate format/sections arguments, returning an error message if invalid."""
+    if format not in OUTPUT_FORMATS:
+        return f"Error: Unknown format '{format}'. Choose one of: {', '.join(OUTPUT_FORMATS)}"
+    unknown = [section for section in sections or [] if section not in known]
+    if unknown:
+        return f"Error: Unknown sections {unknown}. Choose from: {', '.join(known)}"
+    return None
+
+
+def _render(info: Dict[str, Any], format: str) -> types.CallToolResult:
+    """
+    Serialize raw tool output for the json and structured formats.
+
+    Both send compact JSON as the text block; only "structured" also
+    attaches the data as structuredContent.
+    """
+    text = json.dumps(info, separators=(",", ":"))
+    return types.CallToolResult(
+        content=[types.TextContent(type="text", text=text)],
+        structuredContent=info if format == "structured" else None,
+    )
+
+
+def _system_info(sections: List[str], human: bool) -> Dict[str, Any]:
+    snap = sampler.snapshot()
+    memory = snap["memory"]
+    disk = snap["disk"]
+    cpu_freq = snap.get("cpu_freq")
+    gb = lambda value: f"{value / (1024**3):.2f} GB"
+    info = {}
+    for section in sections:
+        if section in ("system", "python"):
+            info[section] = host_facts()[section]
+        elif section == "memory":
+            info["memory"] = {
+                "total": gb(memory.total) if human else memory.total,
+                "available": gb(memory.available) if human else memory.available,
+                "used": gb(memory.used) if human else memory.used,
+                "percentage": f"{memory.percent}%" if human else memory.percent
+            }
+        elif section == "cpu":
+            info["cpu"] = dict(host_facts()["cpu"])
+            if human:
+                info["cpu"]["current_frequency"] = f"{cpu_freq.current:.2f} MHz" if cpu_freq else "N/A"
+                info["cpu"]["usage_percent"] = f"{snap['cpu']}%"
+            else:
+                info["cpu"]["frequency_mhz"] = cpu_freq.current if cpu_freq else None
+                info["cpu"]["usage_percent"] = snap["cpu"]
+        elif section == "disk":
+            percentage = (disk.used / disk.total) * 100
+            info["disk"] = {
+                "total": gb(disk.total) if human else disk.total,
+                "used": gb(disk.used) if human else disk.used,
+                "free": gb(disk.free) if human else disk.free,
+                "percentage": f"{percentage:.1f}%" if human else round(percentage, 2)
+            }
+        elif section == "sample":
+            info["sample"] = {
+                "timestamp": datetime.fromtimestamp(snap["timestamp"]).isoformat() if human else snap["timestamp"],
+                "age_seconds": snap["age_seconds"],
+                "group_ages": snap["ages"]
+            }
+    return info
+
+
+@mcp.tool(structured_output=False)
+@offload
+def get_system_info(format: str = "text", sections: List[str] = None) -> Union[str, types.CallToolResult]:
     """
     Get comprehensive system information.
     
+    Args:
+        format: "text" for readable values (default), "json" for compact JSON
+            with raw numbers (bytes, percent), "structured" for MCP
+            structured content
+        sections: Sections to include - system, python, memory, cpu, disk,
+            sample (defaults to all)
+    
     Returns:
         Detailed system information including OS, hardware, and Python details
     """
+    error = _check_output_options(format, sections, SYSTEM_INFO_SECTIONS)
+    if error:
+        return error
+    
     try:
-        info = {
-            "system": {
-                "platform": platform.platform(),
-                "system": platform.system(),
-                "release": platform.release(),
-                "version": platform.version(),
-                "machine": platform.machine(),
-                "processor": platform.processor(),
-                "architecture": platform.architecture(),
-                "hostname": socket.gethostname(),
-                "boot_time": datetime.fromtimestamp(psutil.boot_time()).isoformat()
-            },
-            "python": {
-                "version": sys.version,
-                "executable": sys.executable,
-                "platform": sys.platform,
-                "implementation": platform.python_implementation(),
-                "compiler": platform.python_compiler()
-            },
-            "memory": {
-                "total": f"{psutil.virtual_memory().total / (1024**3):.2f} GB",
-                "available": f"{psutil.virtual_memory().available / (1024**3):.2f} GB",
-                "used": f"{psutil.virtual_memory().used / (1024**3):.2f} GB",
-                "percentage": f"{psutil.virtual_memory().percent}%"
-            },
-            "cpu": {
-                "physical_cores": psutil.cpu_count(logical=False),
-                "logical_cores": psutil.cpu_count(logical=True),
-                "current_frequency": f"{psutil.cpu_freq().current:.2f} MHz" if psutil.cpu_freq() else "N/A",
-                "usage_percent": f"{psutil.cpu_percent(interval=1)}%"
-            },
-            "disk": {
-                "total": f"{psutil.disk_usage('/').total / (1024**3):.2f} GB",
-                "used": f"{psutil.disk_usage('/').used / (1024**3):.2f} GB",
-                "free": f"{psutil.disk_usage('/').free / (1024**3):.2f} GB",
-                "percentage": f"{(psutil.disk_usage('/').used / psutil.disk_usage('/').total) * 100:.1f}%"
-            }
-        }
-        
-        return json.dumps(info, indent=2)
+        info = _system_info(sections or list(SYSTEM_INFO_SECTIONS), human=format == "text")
+        if format == "text":
+            return json.dumps(info, indent=2)
+        return _render(info, format)
     except Exception as e:
         return f"Error getting system info: {str(e)}"
 
-@mcp.tool()
-def get_running_processes(limit: int = 10) -> str:
+@mcp.tool(structured_output=False)
+@offload
+def get_running_processes(limit: int = 10, sort_by: str = "cpu", format: str = "text") -> Union[str, types.CallToolResult]:
     """
     Get information about running processes.
     
     Args:
         limit: Maximum number of processes to return (default: 10)
+        sort_by: Ranking key - cpu, memory, rss or io (default: cpu)
+        format: "text" for a table (default), "json" for compact JSON rows,
+            "structured" for MCP structured content
         
     Returns:
         Information about running processes
     """
+    if sort_by not in ProcessTracker.SORT_KEYS:
+        return f"Error: Unknown sort key '{sort_by}'. Choose one of: {', '.join(ProcessTracker.SORT_KEYS)}"
+    error = _check_output_options(format, None, ())
+    if error:
+        return error
+    
     try:
-        processes = []
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent', 'status']):
-            try:
-                proc_info = proc.info
-                proc_info['cpu_percent'] = proc.cpu_percent()
-                processes.append(proc_info)
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
+        processes = process_tracker.top(limit, sort_by)
         
-        # Sort by CPU usage
-        processes.sort(key=lambda x: x.get('cpu_percent', 0), reverse=True)
+        if format != "text":
+            rows = [
+                {**proc, "cpu_percent": round(proc["cpu_percent"], 2),
+                 "memory_percent": round(proc["memory_percent"], 2), "io_rate": round(proc["io_rate"], 1)}
+                for proc in processes
+            ]
+            return _render({"sort_by": sort_by, "processes": rows}, format)
         
-        result = f"Top {limit} processes by CPU usage:\n\n"
-        result += f"{'PID':<8} {'Name':<20} {'CPU%':<8} {'Memory%':<10} {'Status':<10}\n"
-        result += "-" * 66 + "\n"
+        lines = [
+            f"Top {limit} processes by {sort_by} usage:",
+            "",
+            f"{'PID':<8} {'Name':<20} {'CPU%':<8} {'Memory%':<10} {'RSS MB':<10} {'IO KB/s':<10} {'Status':<10}",
+            "-" * 88,
+        ]
+        lines.extend(
+            f"{proc['pid']:<8} {proc['name'][:19]:<20} {proc['cpu_percent']:<8.1f} {proc['memory_percent']:<10.1f} {proc['rss'] / (1024**2):<10.1f} {proc['io_rate'] / 1024:<10.1f} {proc['status']:<10}"
+            for proc in processes
+        )
+        return "\n".join(lines) + "\n"
+    except Exception as e:
+        return f"Error getting process info: {str(e)}"
+
+@mcp.tool(structured_output=False)
+@offload
+def find_processes(name: str = None, cmdline: str = None, user: str = None, pids: List[int] = None,
+                   status: str = None, min_cpu: float = 0.0, min_rss_mb: float = 0.0,
+                   sort_by: str = "cpu", limit: int = 50, format: str = "text") -> Union[str, types.CallToolResult]:
+    """
+    Find processes matching server-side filters; all filters must match.
+    
+    Args:
+        name: Regular expression searched for in the process name
+        cmdline: Regular expression searched for in the full command line
+        user: Exact user name owning the process
+        pids: Only consider these process ids
+        status: Exact status, e.g. running, sleeping, idle, zombie, stopped
+        min_cpu: Minimum CPU usage in percent
+        min_rss_mb: Minimum resident memory in MB
+        sort_by: Ranking key - cpu, memory, rss or io (default: cpu)
+        limit: Maximum number of processes to return (default: 50)
+        format: "text" for a table (default), "json" for compact JSON rows,
+            "structured" for MCP structured content
+    
+    Returns:
+        The number of matching processes and the top matches with user and
+        command line
+    """
+    if sort_by not in ProcessTracker.SORT_KEYS:
+        return f"Error: Unknown sort key '{sort_by}'. Choose one of: {', '.join(ProcessTracker.SORT_KEYS)}"
+    error = _check_output_options(format, None, ())
+    if error:
+        return error
+    try:
+        name_pattern = re.compile(name) if name else None
+        cmdline_pattern = re.compile(cmdline) if cmdline else None
+    except re.error as e:
+        return f"Error: Invalid pattern: {str(e)}"
+    
+    try:
+        matched, processes = process_tracker.find(
+            name=name_pattern, cmdline=cmdline_pattern, user=user, pids=pids, status=status,
+            min_cpu=min_cpu, min_rss=int(min_rss_mb * 1024**2), sort_by=sort_by, limit=limit,
+        )
         
-        for proc in processes[:limit]:
-            result += f"{proc['pid']:<8} {proc['name'][:19]:<20} {proc['cpu_percent']:<8.1f} {proc['memory_percent']:<10.1f} {proc['status']:<10}\n"
+        if format != "text":
+            rows = [
+                {**proc, "cpu_percent": round(proc["cpu_percent"], 2),
+                 "memory_percent": round(proc["memory_percent"], 2), "io_rate": round(proc["io_rate"], 1)}
+                for proc in processes
+            ]
+            return _render({"matched": matched, "sort_by": sort_by, "processes": rows}, format)
         
-        return result
+        lines = [
+            f"{matched} matching processes, top {len(processes)} by {sort_by} usage:",
+            "",
+            f"{'PID':<8} {'User':<12} {'Name':<20} {'CPU%':<8} {'Memory%':<10} {'RSS MB':<10} {'Status':<10} Command",
+            "-" * 100,
+        ]
+        lines.extend(
+            f"{proc['pid']:<8} {(proc['user'] or '?')[:11]:<12} {proc['name'][:19]:<20} {proc['cpu_percent']:<8.1f} {proc['memory_percent']:<10.1f} {proc['rss'] / (1024**2):<10.1f} {proc['status']:<10} {proc['cmdline'][:80]}"
+            for proc in processes
+        )
+        return "\n".join(lines) + "\n"
     except Exception as e:
-        return f"Error getting process info: {str(e)}"
+        return f"Error finding processes: {str(e)}"
+
+# Process.as_dict() attributes reported by get_process_details; those this
+# platform lacks (e.g. num_fds on Windows) are skipped
+PROCESS_DETAIL_ATTRS = (
+    "name", "exe", "cmdline", "cwd", "username", "status", "create_time", "ppid", "nice",
+    "num_threads", "num_fds", "cpu_times", "memory_info", "io_counters",
+    "threads", "open_files", "net_connections",
+)
+
 
-@mcp.tool()
-def get_network_info() -> str:
+def _address(addr: Any) -> Optional[str]:
+    """Format a socket address: (ip, port) tuples as ip:port, unix paths as-is."""
+    if not addr:
+        return None
+    if isinstance(addr, tuple):
+        return f"[{addr.ip}]:{addr.port}" if ":" in addr.ip else f"{addr.ip}:{addr.port}"
+    return addr
+
+
+def _process_details(pid: int, limit: int, human: bool) -> Dict[str, Any]:
+    proc = psutil.Process(pid)
+    attrs = [attr for attr in PROCESS_DETAIL_ATTRS if hasattr(proc, attr)]
+    # One oneshot() block so stat/status and friends are parsed once; fields
+    # the caller may not read come back as None instead of failing the call
+    with proc.oneshot():
+        raw = proc.as_dict(attrs=attrs, ad_value=None)
+    info = {"pid": pid, **{attr: raw[attr] for attr in attrs}}
+    mb = lambda value: f"{value / (1024**2):.1f} MB"
+    
+    info["cmdline"] = " ".join(info["cmdline"] or ())
+    if info["create_time"] is not None and human:
+        info["create_time"] = datetime.fromtimestamp(info["create_time"]).isoformat()
+    for field in ("cpu_times", "memory_info", "io_counters"):
+        if info.get(field) is not None:
+            info[field] = info[field]._asdict()
+    if info.get("memory_info") and human:
+        info["memory_info"] = {key: mb(value) for key, value in info["memory_info"].items()}
+    
+    # Rates need two readings; reuse the tracker's last scan rather than
+    # blocking here for a fresh interval (null until a scan has seen it)
+    row = process_tracker.latest(pid)
+    info["cpu_percent"] = round(row["cpu_percent"], 2) if row else None
+    info["memory_percent"] = round(row["memory_percent"], 2) if row else None
+    info["io_rate"] = round(row["io_rate"], 1) if row else None
+    
+    if info.get("threads") is not None:
+        info["threads"] = [thread._asdict() for thread in info["threads"][:limit]]
+    open_files = info.pop("open_files", None)
+    info["num_open_files"] = len(open_files) if open_files is not None else None
+    info["open_files"] = open_files and [
+        {"path": f.path, "fd": f.fd, "mode": getattr(f, "mode", None)} for f in open_files[:limit]
+    ]
+    connections = info.pop("net_connections", None)
+    info["num_connections"] = len(connections) if connections is not None else None
+    info["connections"] = connections and [
+        {
+            "fd": conn.fd,
+            "family": getattr(conn.family, "name", str(conn.family)),
+            "type": getattr(conn.type, "name", str(conn.type)),
+            "laddr": _address(conn.laddr),
+            "raddr": _address(conn.raddr),
+            "status": conn.status,
+        }
+        for conn in connections[:limit]
+    ]
+    return info
+
+
+@mcp.tool(structured_output=False)
+@offload
+def get_process_details(pid: int, limit: int = 100, format: str = "text") -> Union[str, types.CallToolResult]:
+    """
+    Get details of one process: identity, memory, CPU times, IO counters,
+    threads, open files and network connections.
+    
+    Args:
+        pid: Process id
+        limit: Maximum number of threads, open files and connections listed
+            (default: 100; the totals are always reported)
+        format: "text" for readable values (default), "json" for compact JSON
+            with raw numbers, "structured" for MCP structured content
+    
+    Returns:
+        Process details; fields the server may not read are null
+    """
+    error = _check_output_options(format, None, ())
+    if error:
+        return error
+    
+    try:
+        info = _process_details(pid, limit, human=format == "text")
+        if format == "text":
+            return json.dumps(info, indent=2)
+        return _render(info, format)
+    except psutil.NoSuchProcess:
+        return f"Error: No process with PID {pid}"
+    except Exception as e:
+        return f"Error getting process details: {str(e)}"
+
+@mcp.tool(structured_output=False)
+@offload
+def get_network_info(format: str = "text", sections: List[str] = None) -> Union[str, types.CallToolResult]:
     """
     Get network interface information.
     
+    Args:
+        format: "text" for readable values (default), "json" for compact JSON
+            with raw numbers (bytes/s, packets/s), "structured" for MCP
+            structured content
+        sections: Sections to include - interfaces, connections, io_rates
+            (defaults to all)
+    
     Returns:
-        Information about network interfaces and connections
+        Information about network interfaces, connections and per-interface
+        throughput
     """
+    error = _check_output_options(format, sections, NETWORK_INFO_SECTIONS)
+    if error:
+        return error
+    sections = sections or list(NETWORK_INFO_SECTIONS)
+    human = format == "text"
+    
     try:
-        info = {
-            "interfaces": {},
-            "connections": {
-                "total": len(psutil.net_connections()),
-                "listening": len([c for c in psutil.net_connections() if c.status == 'LISTEN']),
-                "established": len([c for c in psutil.net_connections() if c.status == 'ESTABLISHED'])
-            }
-        }
+        info = {}
         
         # Get network interface information
-        for interface, addrs in psutil.net_if_addrs().items():
-            info["interfaces"][interface] = []
-            for addr in addrs:
-                addr_info = {
-                    "family": str(addr.family),
-                    "address": addr.address,
-                    "netmask": addr.netmask,
-                    "broadcast": addr.broadcast
-                }
-                info["interfaces"][interface].append(addr_info)
+        if "interfaces" in sections:
+            info["interfaces"] = {}
+            for interface, addrs in psutil.net_if_addrs().items():
+                info["interfaces"][interface] = []
+                for addr in addrs:
+                    addr_info = {
+                        "family": str(addr.family) if human else getattr(addr.family, "name", str(addr.family)),
+                        "address": addr.address,
+                        "netmask": addr.netmask,
+                        "broadcast": addr.broadcast
+                    }
+                    info["interfaces"][interface].append(addr_info)
         
-        # Get network I/O statistics
-        net_io = psutil.net_io_counters()
-        info["io_stats"] = {
-            "bytes_sent": f"{net_io.bytes_sent / (1024**2):.2f} MB",
-            "bytes_recv": f"{net_io.bytes_recv / (1024**2):.2f} MB",
-            "packets_sent": net_io.packets_sent,
-            "packets_recv": net_io.packets_recv
-        }
+        if "connections" in sections:
+            connections = connection_stats.counts()
+            info["connections"] = {
+                "total": connections["total"],
+                "listening": connections["tcp_states"].get(psutil.CONN_LISTEN, 0),
+                "established": connections["tcp_states"].get(psutil.CONN_ESTABLISHED, 0),
+                "tcp": connections["tcp"],
+                "udp": connections["udp"],
+                "tcp_states": connections["tcp_states"],
+                "age_seconds": connections["age_seconds"]
+            }
+        
+        # Get per-interface throughput from the background sampler
+        if "io_rates" in sections:
+            snap = sampler.snapshot()
+            if human:
+                info["io_rates"] = {
+                    interface: {
+                        "bytes_sent": f"{rates['bytes_sent'] / 1024:.2f} KB/s",
+                        "bytes_recv": f"{rates['bytes_recv'] / 1024:.2f} KB/s",
+                        "packets_sent": f"{rates['packets_sent']:.1f} packets/s",
+                        "packets_recv": f"{rates['packets_recv']:.1f} packets/s"
+                    }
+                    for interface, rates in snap["net_io"].items()
+                }
+            else:
+                info["io_rates"] = {
+                    interface: {field: round(rate, 1) for field, rate in rates.items()}
+                    for interface, rates in snap["net_io"].items()
+                }
+            info["io_rates_age_seconds"] = snap["ages"]["net_io"]
         
-        return json.dumps(info, indent=2)
+        if human:
+            return json.dumps(info, indent=2)
+        return _render(info, format)
     except Exception as e:
         return f"Error getting network info: {str(e)}"
 
-@mcp.tool()
-def execute_command(command: str) -> str:
+def shell_operators(command: str) -> List[str]:
+    """
+    Find the unquoted shell operators in a command line.
+    
+    shlex.split() drops the quotes, which would make an argument such as
+    grep '|' look like a pipe. Tokenizing in non-POSIX mode keeps quoted
+    words intact, so only bare operators like |, && or 2>&1 are returned.
+    
+    Args:
+        command: The command line as given to execute_command
+        
+    Returns:
+        The operator tokens, in order
+    """
+    lexer = shlex.shlex(command, posix=False, punctuation_chars=SHELL_OPERATOR_CHARS)
+    lexer.whitespace_split = True
+    return [token for token in lexer if token and set(token) <= set(SHELL_OPERATOR_CHARS)]
+
+@mcp.tool(structured_output=False)
+async def execute_command(command: str, ctx: Context = None) -> str:
     """
     Execute a system command safely (read-only commands only).
     
+    The command runs without a shell, so pipes, redirection and globs are
+    not available. Output is streamed as progress notifications while the
+    command runs and is capped in size.
+    
     Args:
         command: The command to execute
         
     Returns:
         Command output or error message
     """
-    # Whitelist of safe read-only commands
-    safe_commands = [
-        'ls', 'pwd', 'whoami', 'date', 'uptime', 'df', 'free', 'ps',
-        'top', 'htop', 'netstat', 'ifconfig', 'ping', 'traceroute',
-        'cat', 'head', 'tail', 'grep', 'find', 'which', 'whereis'
-    ]
+    try:
+        argv = shlex.split(command)
+    except ValueError as e:
+        return f"Error: Could not parse command '{command}': {str(e)}"
     
     # Extract the base command
-    base_command = command.split()[0] if command.split() else ""
+    base_command = argv[0] if argv else ""
     
-    if base_command not in safe_commands:
+    if base_command not in SAFE_COMMANDS:
         return f"Error: Command '{base_command}' is not allowed. Only safe read-only commands are permitted."
     
+    operators = shell_operators(command)
+    if operators:
+        return f"Error: Shell operators {operators} are not supported. Commands run without a shell."
+    
+    cacheable = base_command in CACHEABLE_COMMANDS
+    if cacheable:
+        cached = command_cache.get(argv)
+        if cached is not None:
+            return cached
+    
     try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=10  # 10 second timeout
-        )
+        note = ""
+        fast_path = FAST_COMMANDS.get(base_command)
+        result = None
+        if fast_path:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(tool_pool, fast_path, argv[1:])
+        if result is not None:
+            returncode, stdout, stderr = result
+        else:
+            run = await CommandRun(argv, ctx).run()
+            returncode = run.returncode
+            stdout = run.stdout.decode("utf-8", errors="replace")
+            stderr = run.stderr.decode("utf-8", errors="replace")
+            if run.truncated:
+                note = f"\n[Output truncated at {COMMAND_MAX_BYTES} bytes / {COMMAND_MAX_LINES} lines]"
+            if run.timed_out:
+                return f"Error: Command '{command}' timed out after {COMMAND_TIMEOUT:g} seconds\nPartial output:\n{stdout}{note}"
         
-        if result.returncode == 0:
-            return f"Command: {command}\nOutput:\n{result.stdout}"
+        if returncode == 0 or note:
+            output = f"Command: {command}\nOutput:\n{stdout}{note}"
+            if cacheable and not note:
+                command_cache.put(argv, output)
+            return output
         else:
-            return f"Command: {command}\nError (exit code {result.returncode}):\n{result.stderr}"
+            return f"Command: {command}\nError (exit code {returncode}):\n{stderr}{note}"
             
-    except subprocess.TimeoutExpired:
-        return f"Error: Command '{command}' timed out after 10 seconds"
     except Exception as e:
         return f"Error executing command '{command}': {str(e)}"
 
@@ -203,13 +1925,14 @@ def get_system_resource() -> str:
         Basic system information
     """
     return f"""System Information Resource
-Platform: {platform.platform()}
+Platform: {host_facts()['system']['platform']}
 Python: {sys.version.split()[0]}
-Hostname: {socket.gethostname()}
+Hostname: {host_facts()['system']['hostname']}
 Current Time: {datetime.now().isoformat()}
 """
 
 @mcp.resource("system://stats")
+@offload
 def get_system_stats() -> str:
     """
     Get system statistics as a resource.
@@ -218,19 +1941,60 @@ def get_system_stats() -> str:
         Current system statistics
     """
     try:
-        cpu_percent = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
+        snap = sampler.snapshot()
+        memory = snap["memory"]
+        disk = snap["disk"]
         
         return f"""System Statistics
-CPU Usage: {cpu_percent}%
+CPU Usage: {snap['cpu']}%
 Memory Usage: {memory.percent}% ({memory.used / (1024**3):.1f}GB / {memory.total / (1024**3):.1f}GB)
 Disk Usage: {(disk.used / disk.total) * 100:.1f}% ({disk.used / (1024**3):.1f}GB / {disk.total / (1024**3):.1f}GB)
-Boot Time: {datetime.fromtimestamp(psutil.boot_time()).strftime('%Y-%m-%d %H:%M:%S')}
+Boot Time: {datetime.fromisoformat(host_facts()['system']['boot_time']).strftime('%Y-%m-%d %H:%M:%S')}
+Sample Age: {snap['age_seconds']:.3f}s
 """
     except Exception as e:
         return f"Error getting system stats: {str(e)}"
 
+@mcp.tool(structured_output=False)
+@offload
+def get_metrics_history(window_seconds: float = 3600, points: int = 300, fields: List[str] = None) -> str:
+    """
+    Get a downsampled history of host metrics.
+    
+    Args:
+        window_seconds: How many seconds of history to return (default: 3600)
+        points: Maximum number of time buckets to return (default: 300)
+        fields: Metrics to include - cpu, memory, disk (percent), net_sent,
+            net_recv (bytes/s); defaults to all
+        
+    Returns:
+        Column-oriented JSON with min/avg/max of each metric per time bucket
+    """
+    if window_seconds <= 0:
+        return "Error: window_seconds must be positive"
+    if fields:
+        unknown = [field for field in fields if field not in MetricsHistory.FIELDS]
+        if unknown:
+            return f"Error: Unknown fields {unknown}. Choose from: {', '.join(MetricsHistory.FIELDS)}"
+    
+    try:
+        sampler.snapshot()
+        history = sampler.history.query(window_seconds, points, fields)
+        return json.dumps(history, separators=(",", ":"))
+    except Exception as e:
+        return f"Error getting metrics history: {str(e)}"
+
+@mcp.resource("system://history")
+@offload
+def get_system_history() -> str:
+    """
+    Get the last hour of host metrics as a resource.
+    
+    Returns:
+        Column-oriented JSON with min/avg/max per bucket, at most 300 buckets
+    """
+    return get_metrics_history()
+
 @mcp.prompt()
 def system_analysis_prompt(analysis_type: str = "performance") -> str:
     """
@@ -250,8 +2014,142 @@ def system_analysis_prompt(analysis_type: str = "performance") -> str:
     
     return analysis_prompts.get(analysis_type, analysis_prompts["performance"])
 
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request):
+    """Per-tool and per-resource metrics in the Prometheus text format."""
+    from starlette.responses import PlainTextResponse
+    
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@mcp.custom_route("/debug/profile", methods=["GET", "POST"])
+async def profile_endpoint(request):
+    """
+    Sampling profiler control.
+    
+    GET returns the collected stacks in collapsed-stack format. POST with
+    ?action=start|stop|reset changes the profiler state at runtime.
+    """
+    from starlette.responses import PlainTextResponse
+    
+    if request.method == "POST":
+        action = request.query_params.get("action", "")
+        if action == "start":
+            profiler.start()
+        elif action == "stop":
+            profiler.stop()
+        elif action == "reset":
+            profiler.reset()
+        else:
+            return PlainTextResponse("Error: action must be start, stop or reset\n", status_code=400)
+    return PlainTextResponse(profiler.folded())
+
+async def call_tool(name: str, arguments: Dict[str, Any]):
+    """
+    FastMCP's tools/call handler, passing returned CallToolResults through.
+
+    With structured_output=False FastMCP would serialize a CallToolResult
+    into a text block; hand its content and structuredContent to the
+    low-level server as they are instead.
+    """
+    result = await mcp._tool_manager.call_tool(name, arguments, context=mcp.get_context())
+    if isinstance(result, types.CallToolResult):
+        return result.content, result.structuredContent
+    return mcp._tool_manager.get_tool(name).fn_metadata.convert_result(result)
+
+mcp._mcp_server.call_tool(validate_input=False)(call_tool)
+
+# Time every tool and resource handler registered above
+instrument(mcp)
+install_profiler_toggle()
+
+# Number of uvicorn worker processes; 0 keeps the single-process dev server
+WORKERS = int(os.environ.get("MCP_WORKERS", "0"))
+
+
+def create_app():
+    """
+    Build the streamable HTTP ASGI app for one worker process.
+
+    Used as a uvicorn factory so every worker builds its own session manager.
+    Workers read the collector's shared snapshot when run_workers() started
+    one, and otherwise start their own background sampler. Their handler
+    metrics go to files that any worker sums for /metrics.
+    """
+    global sampler, process_tracker, connection_stats
+    metrics_dir = os.environ.get(METRICS_DIR_ENV)
+    if metrics_dir:
+        REGISTRY.share(metrics_dir)
+    name = os.environ.get(SNAPSHOT_SHM_ENV)
+    if name:
+        shared = SharedSnapshot.attach(name)
+        atexit.register(shared.close)
+        sampler = SharedMetricsSampler(shared)
+        process_tracker = SharedProcessTracker(shared)
+        connection_stats = SharedConnectionStats(shared)
+    sampler.start()
+    return mcp.streamable_http_app()
+
+
+def run_workers(workers: int = WORKERS) -> None:
+    """
+    Serve with multiple uvicorn worker processes and uvloop if installed.
+
+    The server is stateless (stateless_http=True), so any worker can answer
+    any request and no session affinity is needed. Unless
+    MCP_SHARED_SNAPSHOT is off, a single collector process samples the host
+    for all of them, so collection cost does not grow with the worker count.
+    """
+    import multiprocessing
+
+    import uvicorn
+
+    try:
+        import uvloop  # noqa: F401
+        loop = "uvloop"
+    except ImportError:
+        loop = "asyncio"
+
+    # Each worker keeps its handler metrics in a file here; /metrics sums them
+    metrics_dir = tempfile.mkdtemp(prefix="mcp-metrics-")
+    os.environ[METRICS_DIR_ENV] = metrics_dir
+
+    shared = collector = None
+    if SHARED_SNAPSHOT:
+        shared = SharedSnapshot.create()
+        collector = multiprocessing.get_context("spawn").Process(
+            target=run_collector, args=(shared.name, os.getpid()), name="mcp-collector", daemon=True
+        )
+        collector.start()
+        # Inherited by the uvicorn workers, which attach in create_app()
+        os.environ[SNAPSHOT_SHM_ENV] = shared.name
+
+    try:
+        uvicorn.run(
+            "mcp_http_server:create_app",
+            factory=True,
+            host=mcp.settings.host,
+            port=mcp.settings.port,
+            workers=workers,
+            loop=loop,
+            log_level=mcp.settings.log_level.lower(),
+            app_dir=str(Path(__file__).resolve().parent),
+        )
+    finally:
+        if collector is not None:
+            collector.terminate()
+            collector.join(timeout=5)
+            shared.close()
+            shared.unlink()
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
 if __name__ == "__main__":
     # Run the server with streamable HTTP transport
-    print("Starting MCP HTTP Server on http://localhost:8000/mcp")
+    print(f"Starting MCP HTTP Server on http://{mcp.settings.host}:{mcp.settings.port}/mcp")
     print("Use Ctrl+C to stop the server")
-    mcp.run(transport="streamable-http")
+    if WORKERS > 0:
+        print(f"Production mode: {WORKERS} worker processes")
+        run_workers(WORKERS)
+    else:
+        sampler.start()
+        mcp.run(transport="streamable-http")
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+Instrumentation shared by the MCP servers.
+Records per-handler latency, in-flight, error and response-size metrics for
+every registered tool and resource, renders them in the Prometheus text
+format, and provides a sampling profiler that can be toggled at runtime.
+"""
+
+import functools
+import inspect
+import json
+import mmap
+import os
+import signal
+import struct
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Histogram bucket upper bounds: handler latency (seconds) and response size (bytes)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+class Histogram:
+    """
+    Cumulative Prometheus-style histogram with fixed buckets.
+
+    The bucket counts, sum and count live in a view of doubles, so several
+    processes can keep their histograms in files that one of them sums.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...], values: Optional[memoryview] = None):
+        self.buckets = buckets
+        # Bucket counts (the last one is +Inf), then the sum, then the count
+        self.values = values if values is not None else _doubles(self.slots(buckets))
+
+    @staticmethod
+    def slots(buckets: Tuple[float, ...]) -> int:
+        """Number of doubles a histogram with these buckets takes."""
+        return len(buckets) + 3
+
+    def observe(self, value: float) -> None:
+        """Record one observation."""
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.values[i] += 1
+                break
+        else:
+            self.values[len(self.buckets)] += 1
+        self.values[-2] += value
+        self.values[-1] += 1
+
+    def render(self, name: str, labels: str) -> List[str]:
+        """Render the bucket, sum and count samples."""
+        return render_histogram(name, labels, self.buckets, self.values)
+
+
+def _doubles(count: int) -> memoryview:
+    return memoryview(bytearray(8 * count)).cast("d")
+
+
+def render_histogram(name: str, labels: str, buckets: Tuple[float, ...], values) -> List[str]:
+    """Render bucket counts, sum and count laid out like Histogram.values."""
+    lines = []
+    cumulative = 0
+    for bound, count in zip(buckets + ("+Inf",), values):
+        cumulative += int(count)
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f"{name}_sum{{{labels}}} {values[-2]:.6f}")
+    lines.append(f"{name}_count{{{labels}}} {int(values[-1])}")
+    return lines
+
+
+class HandlerMetrics:
+    """Metrics of one tool or resource handler, stored in a view of doubles."""
+
+    LATENCY_SLOTS = Histogram.slots(LATENCY_BUCKETS)
+    SIZE_SLOTS = Histogram.slots(SIZE_BUCKETS)
+    # Both histograms, then the in-flight gauge and the error counter
+    SLOTS = LATENCY_SLOTS + SIZE_SLOTS + 2
+
+    def __init__(self, values: Optional[memoryview] = None):
+        self.values = values if values is not None else _doubles(self.SLOTS)
+        self.latency = Histogram(LATENCY_BUCKETS, self.values[:self.LATENCY_SLOTS])
+        self.response_bytes = Histogram(
+            SIZE_BUCKETS, self.values[self.LATENCY_SLOTS:self.LATENCY_SLOTS + self.SIZE_SLOTS]
+        )
+
+    @property
+    def in_flight(self) -> int:
+        return int(self.values[-2])
+
+    @in_flight.setter
+    def in_flight(self, value: int) -> None:
+        self.values[-2] = value
+
+    @property
+    def errors(self) -> int:
+        return int(self.values[-1])
+
+    @errors.setter
+    def errors(self, value: int) -> None:
+        self.values[-1] = value
+
+
+# Layout of a per-process metrics file: the length of a JSON header naming
+# the handlers, the header padded to 8 bytes, then HandlerMetrics.SLOTS
+# doubles per handler in header order
+METRICS_FILE_HEADER = struct.Struct("<Q")
+METRICS_FILE_SUFFIX = ".metrics"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of per-handler metrics.
+
+    Handlers are keyed by (kind, name) where kind is "tool" or "resource".
+    After share(), the handlers' numbers live in a memory-mapped file in a
+    directory shared by the server's worker processes, and render() sums
+    the files of every worker, so any worker answers a scrape for all.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[Tuple[str, str], HandlerMetrics] = {}
+        self._lock = threading.Lock()
+        self.server = ""
+        self._directory: Optional[str] = None
+        self._mmap = None
+
+    def _get(self, kind: str, name: str) -> HandlerMetrics:
+        key = (kind, name)
+        metrics = self._handlers.get(key)
+        if metrics is None:
+            metrics = self._handlers[key] = HandlerMetrics()
+        return metrics
+
+    def register(self, kind: str, name: str) -> None:
+        """Create a handler's metrics up front, so it is shown before its first call."""
+        with self._lock:
+            self._get(kind, name)
+
+    def share(self, directory: str) -> None:
+        """
+        Move this process's metrics into a file in directory and make
+        render() report the sum over every file there.
+
+        Call it once per process after the handlers are registered; handlers
+        first seen later are kept in memory and only reported by their own
+        process.
+
+        Args:
+            directory: Directory shared by all processes of one server
+        """
+        with self._lock:
+            handlers = sorted(self._handlers)
+            header = json.dumps({"server": self.server, "handlers": handlers}).encode("utf-8")
+            header += b" " * (-len(header) % 8)
+            offset = METRICS_FILE_HEADER.size + len(header)
+            size = offset + 8 * HandlerMetrics.SLOTS * len(handlers)
+            path = os.path.join(directory, f"{os.getpid()}{METRICS_FILE_SUFFIX}")
+            # Write the file under a temporary name so readers never see it half-made
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(METRICS_FILE_HEADER.pack(len(header)) + header)
+                f.truncate(size)
+            os.replace(tmp, path)
+            with open(path, "r+b") as f:
+                self._mmap = mmap.mmap(f.fileno(), size)
+            values = memoryview(self._mmap)[offset:].cast("d")
+            for i, key in enumerate(handlers):
+                view = values[i * HandlerMetrics.SLOTS:(i + 1) * HandlerMetrics.SLOTS]
+                view[:] = self._handlers[key].values
+                self._handlers[key] = HandlerMetrics(view)
+            self._directory = directory
+
+    def start(self, kind: str, name: str) -> None:
+        """Mark a call as in flight."""
+        with self._lock:
+            self._get(kind, name).in_flight += 1
+
+    def finish(self, kind: str, name: str, seconds: float, size: Optional[int], error: bool) -> None:
+        """Record a finished call; a size of None leaves the size histogram alone."""
+        with self._lock:
+            metrics = self._get(kind, name)
+            metrics.in_flight -= 1
+            metrics.latency.observe(seconds)
+            if size is not None:
+                metrics.response_bytes.observe(size)
+            if error:
+                metrics.errors += 1
+
+    def _collect(self) -> List[Tuple[Tuple[str, str], List[float]]]:
+        """Per-handler values summed over the processes sharing the directory."""
+        totals: Dict[Tuple[str, str], List[float]] = {}
+        own = os.getpid()
+        for entry in os.scandir(self._directory):
+            if not entry.name.endswith(METRICS_FILE_SUFFIX):
+                continue
+            try:
+                pid = int(entry.name[:-len(METRICS_FILE_SUFFIX)])
+                with open(entry.path, "rb") as f:
+                    data = f.read()
+                (length,) = METRICS_FILE_HEADER.unpack_from(data)
+                offset = METRICS_FILE_HEADER.size + length
+                handlers = json.loads(data[METRICS_FILE_HEADER.size:offset])["handlers"]
+                values = memoryview(data)[offset:].cast("d")
+            except (OSError, ValueError, struct.error):
+                continue
+            # Counters of a worker that exited still count; its calls in flight do not
+            alive = pid == own or _pid_alive(pid)
+            for i, (kind, name) in enumerate(handlers):
+                slot = values[i * HandlerMetrics.SLOTS:(i + 1) * HandlerMetrics.SLOTS].tolist()
+                if not alive:
+                    slot[-2] = 0.0
+                total = totals.setdefault((kind, name), [0.0] * HandlerMetrics.SLOTS)
+                for j, value in enumerate(slot):
+                    total[j] += value
+            values.release()
+        with self._lock:
+            # Handlers this process only met after share() are not in its file
+            for key, metrics in self._handlers.items():
+                if key not in totals:
+                    totals[key] = metrics.values.tolist()
+        return sorted(totals.items())
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            The metrics page, one sample per line
+        """
+        if self._directory is not None:
+            handlers = self._collect()
+        else:
+            with self._lock:
+                handlers = [(key, metrics.values.tolist()) for key, metrics in sorted(self._handlers.items())]
+        latency_end = HandlerMetrics.LATENCY_SLOTS
+        size_end = latency_end + HandlerMetrics.SIZE_SLOTS
+        lines = [
+            "# HELP mcp_handler_duration_seconds Handler latency in seconds.",
+            "# TYPE mcp_handler_duration_seconds histogram",
+        ]
+        for (kind, name), values in handlers:
+            lines.extend(render_histogram("mcp_handler_duration_seconds", self._labels(kind, name),
+                                          LATENCY_BUCKETS, values[:latency_end]))
+        lines += [
+            "# HELP mcp_handler_response_bytes Size of handler responses in bytes.",
+            "# TYPE mcp_handler_response_bytes histogram",
+        ]
+        for (kind, name), values in handlers:
+            lines.extend(render_histogram("mcp_handler_response_bytes", self._labels(kind, name),
+                                          SIZE_BUCKETS, values[latency_end:size_end]))
+        lines += [
+            "# HELP mcp_handler_in_flight Handler calls currently running.",
+            "# TYPE mcp_handler_in_flight gauge",
+        ]
+        for (kind, name), values in handlers:
+            lines.append(f"mcp_handler_in_flight{{{self._labels(kind, name)}}} {int(values[-2])}")
+        lines += [
+            "# HELP mcp_handler_errors_total Handler calls that raised or returned an error message.",
+            "# TYPE mcp_handler_errors_total counter",
+        ]
+        for (kind, name), values in handlers:
+            lines.append(f"mcp_handler_errors_total{{{self._labels(kind, name)}}} {int(values[-1])}")
+        return "\n".join(lines) + "\n"
+
+    def _labels(self, kind: str, name: str) -> str:
+        escape = lambda value: value.replace("\\", "\\\\").replace('"', '\\"')
+        return f'server="{escape(self.server)}",kind="{kind}",name="{escape(name)}"'
+
+
+# Registry used by instrument() unless another one is passed
+REGISTRY = MetricsRegistry()
+
+
+def _response_size(result: Any) -> Optional[int]:
+    """
+    Size in bytes of a handler result, without serializing it.
+
+    Strings and bytes are measured directly and tool results by their text
+    content blocks. Anything else would have to be encoded a second time
+    just to be measured, so it is not counted and None is returned.
+    """
+    if isinstance(result, str):
+        return len(result) if result.isascii() else len(result.encode("utf-8"))
+    if isinstance(result, (bytes, bytearray)):
+        return len(result)
+    content = getattr(result, "content", None)
+    if isinstance(content, list):
+        texts = [getattr(block, "text", None) for block in content]
+        if all(isinstance(text, str) for text in texts):
+            return sum(_response_size(text) for text in texts)
+    return None
+
+
+def _is_error(result: Any) -> bool:
+    # The servers report failures as messages starting with "Error"
+    return isinstance(result, str) and result.startswith("Error")
+
+
+def _wrap(func: Callable, kind: str, name: str, registry: MetricsRegistry) -> Callable:
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            registry.start(kind, name)
+            started = time.perf_counter()
+            result, error = None, True
+            try:
+                result = await func(*args, **kwargs)
+                error = _is_error(result)
+                return result
+            finally:
+                registry.finish(kind, name, time.perf_counter() - started, _response_size(result), error)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        registry.start(kind, name)
+        started = time.perf_counter()
+        result, error = None, True
+        try:
+            result = func(*args, **kwargs)
+            error = _is_error(result)
+            return result
+        finally:
+            registry.finish(kind, name, time.perf_counter() - started, _response_size(result), error)
+    return wrapper
+
+
+def instrument(server: Any, registry: MetricsRegistry = REGISTRY) -> None:
+    """
+    Wrap every tool, resource and resource template registered on a server.
+
+    Works with both the MCP SDK's FastMCP and the standalone fastmcp package,
+    which keep handlers as objects with an ``fn`` attribute in their tool and
+    resource managers. Call it once, after all handlers are registered.
+
+    Args:
+        server: The FastMCP server instance
+        registry: Registry that receives the measurements
+    """
+    registry.server = server.name
+    handlers = [("tool", name, tool) for name, tool in server._tool_manager._tools.items()]
+    handlers += [("resource", uri, res) for uri, res in server._resource_manager._resources.items()]
+    handlers += [("resource", uri, res) for uri, res in server._resource_manager._templates.items()]
+    for kind, name, handler in handlers:
+        fn = getattr(handler, "fn", None)
+        if fn is None or getattr(fn, "__mcp_instrumented__", False):
+            continue
+        registry.register(kind, str(name))
+        wrapped = _wrap(fn, kind, str(name), registry)
+        wrapped.__mcp_instrumented__ = True
+        handler.fn = wrapped
+
+
+# Seconds between two stack samples of the profiler
+PROFILE_INTERVAL = float(os.environ.get("MCP_PROFILE_INTERVAL", "0.005"))
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that samples the stacks of all threads.
+
+    While running, a daemon thread captures sys._current_frames() every
+    PROFILE_INTERVAL seconds and counts each distinct stack. folded() returns
+    them in the collapsed-stack format used by flame graph tools.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        """Whether the profiler is currently sampling."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            with self._lock:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> None:
+        """Start sampling; samples from earlier runs are kept."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mcp-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def toggle(self) -> bool:
+        """Start the profiler if it is stopped, stop it otherwise; returns the new state."""
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+        return self.running
+
+    def reset(self) -> None:
+        """Drop all collected samples."""
+        with self._lock:
+            self.samples.clear()
+
+    def folded(self, limit: int = 500) -> str:
+        """
+        Get the most frequent stacks in collapsed-stack format.
+
+        Args:
+            limit: Maximum number of distinct stacks to return
+
+        Returns:
+            One "frame;frame;frame count" line per stack, most frequent first
+        """
+        with self._lock:
+            top = self.samples.most_common(limit)
+        state = "running" if self.running else "stopped"
+        header = f"# profiler {state}, {sum(self.samples.values())} samples\n"
+        return header + "".join(f"{stack} {count}\n" for stack, count in top)
+
+
+profiler = SamplingProfiler()
+
+
+def install_profiler_toggle() -> None:
+    """
+    Toggle the profiler on SIGUSR2 and start it now if MCP_PROFILE is set.
+
+    The signal lets an operator profile a running server, including a stdio
+    server that has no side channel: ``kill -USR2 <pid>``.
+    """
+    if os.environ.get("MCP_PROFILE", "").lower() in ("1", "true", "yes"):
+        profiler.start()
+    if not hasattr(signal, "SIGUSR2"):
+        return
+    try:
+        signal.signal(signal.SIGUSR2, lambda signum, frame: profiler.toggle())
+    except ValueError:
+        # signal.signal only works in the main thread
+        pass
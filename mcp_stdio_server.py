@@ -4,20 +4,377 @@ MCP Server with stdio transport - File Operations Tool
 This server exposes a file operations tool that can read, write, and list files.
 """
 
+import asyncio
+import base64
+import bisect
+import codecs
+import fnmatch
+import glob
+import hashlib
+import itertools
+import json
+import mimetypes
+import mmap
+import os
+import re
+import stat
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple, Union
 
 from fastmcp import FastMCP
+from mcp import types
+from mcp.server.lowlevel.helper_types import ReadResourceContents
+
+from mcp_common import offload
+from mcp_metrics import REGISTRY, install_profiler_toggle, instrument, profiler
 
 # Create an MCP server
 mcp = FastMCP("FileOperationsServer")
 
+# Largest slice of a file returned by one read_file call or file:// read
+READ_PAGE_BYTES = int(os.environ.get("MCP_READ_PAGE_BYTES", str(1024 * 1024)))
+# Files at least this large are memory-mapped instead of read into memory
+MMAP_THRESHOLD = int(os.environ.get("MCP_MMAP_THRESHOLD", str(4 * 1024 * 1024)))
+# Bytes at the start of a file inspected to decide whether it is binary
+BINARY_SNIFF_BYTES = 8192
+
+
+class PathLocks:
+    """
+    One lock per file path, created on first use and dropped once nobody
+    holds or waits for it.
+
+    Writers hold a path's lock from the expected_hash check to the rename,
+    so two concurrent edits of one file cannot both pass the check and
+    silently lose one of the changes. Paths are resolved first, so a file
+    reached through a symlink shares the lock of its target.
+    """
+
+    def __init__(self):
+        # resolved path -> [lock, holders and waiters]
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self, path: Union[str, Path]) -> Iterator[None]:
+        key = os.path.realpath(path)
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+
+write_locks = PathLocks()
+
+
+def is_binary(buf: Union[bytes, mmap.mmap]) -> bool:
+    """Guess whether a buffer holds binary data from its first bytes."""
+    sample = buf[:BINARY_SNIFF_BYTES]
+    if b"\0" in sample:
+        return True
+    try:
+        # final=False tolerates a multi-byte character cut off by the sample
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return True
+    return False
+
+
+# Total bytes of file content kept in memory by the content cache (0 disables it)
+CONTENT_CACHE_BYTES = int(os.environ.get("MCP_CONTENT_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+
+class CachedContent(NamedTuple):
+    """Content of one file as it was at (mtime_ns, size)."""
+    mtime_ns: int
+    size: int
+    data: bytes
+    binary: bool
+    text: Optional[str]
+
+
+class ContentCache:
+    """
+    LRU cache of file contents bounded by a total byte budget.
+
+    Entries are keyed by absolute path and only served while the file's
+    st_mtime_ns and st_size still match, so a hit costs a single stat.
+    """
+
+    def __init__(self, max_bytes: int = CONTENT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, CachedContent]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cost(entry: CachedContent) -> int:
+        return len(entry.data) + (sys.getsizeof(entry.text) if entry.text is not None else 0)
+
+    def get(self, key: str, st: os.stat_result) -> Optional[CachedContent]:
+        """Get the cached content of key if the file has not changed since."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.mtime_ns != st.st_mtime_ns or entry.size != st.st_size:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, entry: CachedContent) -> None:
+        """Cache an entry, evicting the least recently used ones over budget."""
+        cost = self._cost(entry)
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= self._cost(old)
+            self._entries[key] = entry
+            self.bytes += cost
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= self._cost(evicted)
+                self.evictions += 1
+
+    def discard(self, key: str) -> None:
+        """Drop the entry of key, e.g. after the file was written."""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= self._cost(old)
+
+    def render(self) -> str:
+        """
+        Render the cache counters in the Prometheus text exposition format.
+
+        Returns:
+            The counter samples, one per line
+        """
+        with self._lock:
+            samples = [
+                ("mcp_content_cache_hits_total", "counter", "Reads served from the content cache.", self.hits),
+                ("mcp_content_cache_misses_total", "counter", "Reads that had to go to disk.", self.misses),
+                ("mcp_content_cache_evictions_total", "counter", "Entries dropped to stay within the byte budget.", self.evictions),
+                ("mcp_content_cache_bytes", "gauge", "Bytes held by the content cache.", self.bytes),
+                ("mcp_content_cache_entries", "gauge", "Files held by the content cache.", len(self._entries)),
+            ]
+        lines = []
+        for name, kind, help_text, value in samples:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+content_cache = ContentCache()
+
+
+def load_content(path: Path, st: Optional[os.stat_result] = None) -> CachedContent:
+    """
+    Get the content of a small file, from the content cache when unchanged.
+
+    Args:
+        path: Path of a file smaller than MMAP_THRESHOLD
+        st: Result of a stat of path that was just taken, if any
+
+    Returns:
+        The file's bytes, whether they are binary, and the decoded text
+    """
+    key = os.path.abspath(path)
+    cached = content_cache.get(key, st or os.stat(key))
+    if cached is not None:
+        return cached
+    with open(key, 'rb') as f:
+        st = os.fstat(f.fileno())
+        data = f.read()
+    binary = is_binary(data)
+    entry = CachedContent(st.st_mtime_ns, len(data), data, binary,
+                          None if binary else data.decode("utf-8", errors="replace"))
+    # Only cache what matches the stat taken while the file was open
+    if len(data) == st.st_size:
+        content_cache.put(key, entry)
+    return entry
+
+
+@contextmanager
+def open_content(path: Path) -> Iterator[Tuple[Union[bytes, mmap.mmap], bool, Optional[str]]]:
+    """
+    Open a file as a read-only buffer that supports slicing, find and rfind.
+
+    Small files come from the content cache; large ones are memory-mapped so
+    only the pages that are actually touched get loaded.
+
+    Yields:
+        The buffer, whether it holds binary data, and the decoded text of
+        the whole file when it is available without extra work
+    """
+    st = os.stat(path)
+    if st.st_size < MMAP_THRESHOLD:
+        entry = load_content(path, st)
+        yield entry.data, entry.binary, entry.text
+        return
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm, is_binary(mm), None
+
+
+def line_offset(buf: Union[bytes, mmap.mmap], line: int) -> int:
+    """Byte offset at which 1-based `line` starts, or the size if past the end."""
+    pos = 0
+    for _ in range(line - 1):
+        newline = buf.find(b"\n", pos)
+        if newline < 0:
+            return len(buf)
+        pos = newline + 1
+    return pos
+
+
+def tail_offset(buf: Union[bytes, mmap.mmap], lines: int) -> int:
+    """Byte offset at which the last `lines` lines start, searching from the end."""
+    pos = len(buf)
+    if pos and buf[pos - 1] == ord("\n"):
+        pos -= 1
+    for _ in range(lines):
+        newline = buf.rfind(b"\n", 0, pos)
+        if newline < 0:
+            return 0
+        pos = newline
+    return pos + 1
+
+
+def page_end(buf: Union[bytes, mmap.mmap], start: int, end: int, binary: bool) -> int:
+    """
+    Clip [start, end) to READ_PAGE_BYTES without splitting a line or character.
+
+    Text pages end after the last complete line when there is one, otherwise
+    on a UTF-8 character boundary.
+    """
+    if end - start <= READ_PAGE_BYTES:
+        return end
+    end = start + READ_PAGE_BYTES
+    if binary:
+        return end
+    newline = buf.rfind(b"\n", start, end)
+    if newline >= start:
+        return newline + 1
+    while end > start + 1 and buf[end] & 0xC0 == 0x80:
+        end -= 1
+    return end
+
+
+def parse_cursor(cursor: str) -> Tuple[int, int]:
+    """Split a "start:end" continuation cursor into byte offsets."""
+    start, _, end = cursor.partition(":")
+    start, end = int(start), int(end)
+    if start < 0 or end < start:
+        raise ValueError(cursor)
+    return start, end
+
+
+def read_range(path: Path, offset: int = 0, length: Optional[int] = None,
+               start_line: Optional[int] = None, end_line: Optional[int] = None,
+               head: Optional[int] = None, tail: Optional[int] = None,
+               cursor: Optional[str] = None) -> Tuple[dict, Union[str, bytes]]:
+    """
+    Read one page of a file.
+
+    Returns:
+        A description of the page (start, end, size, next_cursor, binary,
+        whole) and its content: text for text files, raw bytes for binary ones
+    """
+    with open_content(path) as (buf, binary, text):
+        size = len(buf)
+        if cursor is not None:
+            start, end = parse_cursor(cursor)
+        elif head is not None:
+            start, end = 0, line_offset(buf, head + 1)
+        elif tail is not None:
+            start, end = tail_offset(buf, tail), size
+        elif start_line is not None or end_line is not None:
+            start = line_offset(buf, start_line or 1)
+            end = line_offset(buf, end_line + 1) if end_line is not None else size
+        else:
+            start = offset
+            end = size if length is None else offset + length
+        start, end = min(start, size), min(end, size)
+
+        stop = page_end(buf, start, end, binary)
+        whole = start == 0 and stop == size
+        if whole and text is not None:
+            content = text
+        else:
+            data = buf[start:stop]
+            content = data if binary else data.decode("utf-8", errors="replace")
+
+    page = {
+        "start": start,
+        "end": stop,
+        "size": size,
+        "binary": binary,
+        "whole": whole,
+        "next_cursor": f"{stop}:{end}" if stop < end else None,
+    }
+    return page, content
+
+
+def format_page(file_path: str, page: dict, content: Union[str, bytes]) -> str:
+    """Render a page returned by read_range with a header and continuation hint."""
+    if page["binary"]:
+        header = f"Binary contents of '{file_path}' (bytes {page['start']}-{page['end']} of {page['size']}, base64):"
+        body = base64.b64encode(content).decode("ascii")
+    elif page["whole"]:
+        header = f"Contents of '{file_path}':"
+        body = content
+    else:
+        header = f"Contents of '{file_path}' (bytes {page['start']}-{page['end']} of {page['size']}):"
+        body = content
+    text = f"{header}\n{body}"
+    if page["next_cursor"]:
+        text += f"\n[Truncated at byte {page['end']}; call read_file with cursor=\"{page['next_cursor']}\" to continue]"
+    return text
+
+
 @mcp.tool()
-def read_file(file_path: str) -> str:
+@offload
+def read_file(file_path: str, offset: int = 0, length: Optional[int] = None,
+              start_line: Optional[int] = None, end_line: Optional[int] = None,
+              head: Optional[int] = None, tail: Optional[int] = None,
+              cursor: Optional[str] = None) -> str:
     """
     Read the contents of a file.
     
+    By default the whole file is returned. Large results are split into pages
+    of at most MCP_READ_PAGE_BYTES; each page ends with a cursor that
+    continues where it stopped. Binary files are returned base64-encoded.
+    
     Args:
         file_path: Path to the file to read
+        offset: Byte offset to start reading at
+        length: Number of bytes to read from offset (defaults to the rest of the file)
+        start_line: First line to read, 1-based
+        end_line: Last line to read, inclusive (defaults to the last line)
+        head: Read only the first N lines
+        tail: Read only the last N lines
+        cursor: Continuation cursor returned by a previous truncated read
         
     Returns:
         The contents of the file as a string
@@ -29,46 +386,629 @@ def read_file(file_path: str) -> str:
         
         if not path.is_file():
             return f"Error: '{file_path}' is not a file"
-            
-        with open(path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        return f"Contents of '{file_path}':\n{content}"
+
+        modes = [offset != 0 or length is not None, start_line is not None or end_line is not None,
+                 head is not None, tail is not None, cursor is not None]
+        if sum(modes) > 1:
+            return "Error: Use only one of offset/length, start_line/end_line, head, tail or cursor"
+        if offset < 0 or (length is not None and length < 0):
+            return "Error: offset and length must not be negative"
+        if (start_line is not None and start_line < 1) or (end_line is not None and end_line < 1):
+            return "Error: Line numbers start at 1"
+        if start_line is not None and end_line is not None and end_line < start_line:
+            return "Error: end_line must not be before start_line"
+        if (head is not None and head < 1) or (tail is not None and tail < 1):
+            return "Error: head and tail must be at least 1"
+        if cursor is not None:
+            try:
+                parse_cursor(cursor)
+            except ValueError:
+                return f"Error: Invalid cursor '{cursor}'"
+
+        page, content = read_range(path, offset, length, start_line, end_line, head, tail, cursor)
+        return format_page(file_path, page, content)
     except Exception as e:
         return f"Error reading file '{file_path}': {str(e)}"
 
+WRITE_MODES = ("overwrite", "append")
+
+
+def file_sha256(path: Union[str, Path]) -> str:
+    """SHA-256 of a file's contents, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def check_expected_hash(path: Path, expected_hash: Optional[str]) -> Optional[str]:
+    """
+    Compare a file's SHA-256 with the hash the client last saw.
+
+    Returns:
+        An error message if the file changed (or is missing), otherwise None
+    """
+    if expected_hash is None:
+        return None
+    if not path.is_file():
+        return f"Error: '{path}' does not exist, expected sha256 {expected_hash}"
+    actual = file_sha256(path)
+    if actual != expected_hash.lower():
+        return f"Error: '{path}' was modified (sha256 {actual}, expected {expected_hash}); re-read it and retry"
+    return None
+
+
+def read_umask() -> int:
+    """
+    The process umask, without changing it when /proc can tell.
+
+    os.umask() is process-wide, so setting it even briefly would let files
+    created by concurrent tool threads pick up the temporary value; the
+    fallback round trip is only done once, at import.
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Permission bits removed from files that atomic_write creates
+UMASK = read_umask()
+
+
+def atomic_write(path: Path, data: bytes) -> None:
+    """
+    Replace a file's contents in one step.
+
+    The data is written and fsynced to a temporary file in the same
+    directory, which is then renamed over the target, so readers and a
+    crash see either the old or the new contents, never a torn file. An
+    existing file keeps its permission bits. A symlink is written through:
+    the link's target is replaced, and the link is left in place.
+    """
+    link = path
+    path = Path(os.path.realpath(path))
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o666 & ~UMASK
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    content_cache.discard(os.path.abspath(link))
+    content_cache.discard(str(path))
+
+
 @mcp.tool()
-def write_file(file_path: str, content: str) -> str:
+@offload
+def write_file(file_path: str, content: str, mode: str = "overwrite",
+               expected_hash: Optional[str] = None) -> str:
     """
     Write content to a file.
     
+    Overwrites are atomic: the content goes to a temporary file that is
+    renamed over the target, so the file is never left half-written.
+    
     Args:
         file_path: Path to the file to write
         content: Content to write to the file
+        mode: "overwrite" to replace the file or "append" to add to its end
+        expected_hash: Only write if the file's current SHA-256 matches this
         
     Returns:
         Success or error message
     """
     try:
         path = Path(file_path)
+        if mode not in WRITE_MODES:
+            return f"Error: mode must be one of {', '.join(WRITE_MODES)}"
         
         # Create parent directories if they don't exist
         path.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(path, 'w', encoding='utf-8') as f:
-            f.write(content)
-            
-        return f"Successfully wrote {len(content)} characters to '{file_path}'"
+
+        data = content.encode('utf-8')
+        with write_locks.hold(path):
+            error = check_expected_hash(path, expected_hash)
+            if error:
+                return error
+
+            if mode == "append":
+                with open(path, 'ab') as f:
+                    f.write(data)
+                content_cache.discard(os.path.abspath(path))
+                return f"Successfully appended {len(content)} characters to '{file_path}'"
+
+            atomic_write(path, data)
+        return f"Successfully wrote {len(content)} characters to '{file_path}' (sha256 {hashlib.sha256(data).hexdigest()})"
     except Exception as e:
         return f"Error writing to file '{file_path}': {str(e)}"
 
+
+def split_lines(text: str) -> List[str]:
+    """Split text into lines that keep their line endings ("\\r\\n" stays intact)."""
+    parts = text.split("\n")
+    lines = [part + "\n" for part in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def parse_unified_diff(diff: str) -> List[Tuple[int, List[Tuple[str, str, bool]]]]:
+    """
+    Parse the hunks of a single-file unified diff.
+
+    Returns:
+        (old start line, [(tag, text, has newline)]) per hunk, where tag is
+        " ", "-" or "+" and text has no line ending
+    """
+    hunks = []
+    current = None
+    for line in diff.splitlines():
+        header = HUNK_HEADER.match(line)
+        if header:
+            current = []
+            hunks.append((int(header.group(1)), current))
+        elif current is None:
+            # ---/+++ file headers and anything else before the first hunk
+            continue
+        elif line.startswith("\\"):
+            # "\ No newline at end of file" applies to the previous line
+            if current:
+                tag, text, _ = current[-1]
+                current[-1] = (tag, text, False)
+        elif line[:1] in (" ", "-", "+"):
+            current.append((line[0], line[1:].rstrip("\r"), True))
+        elif line == "":
+            current.append((" ", "", True))
+        else:
+            raise ValueError(f"unexpected line in hunk: {line!r}")
+    if not hunks:
+        raise ValueError("no @@ hunks found")
+    return hunks
+
+
+def apply_unified_diff(lines: List[str], diff: str, newline: str) -> Tuple[List[str], int, int, int]:
+    """
+    Apply a unified diff to a file's lines.
+
+    Each hunk is placed where its context and removed lines match, nearest
+    to the line its header names, so diffs made against a slightly older
+    version still apply.
+
+    Returns:
+        The new lines, and the number of hunks, added and removed lines
+    """
+    result, cursor = [], 0
+    added = removed = 0
+    hunks = parse_unified_diff(diff)
+    for number, (old_start, body) in enumerate(hunks, 1):
+        old = [text for tag, text, _ in body if tag != "+"]
+        expected = old_start if not old else old_start - 1
+        candidates = [
+            pos for pos in range(cursor, len(lines) - len(old) + 1)
+            if all(lines[pos + i].rstrip("\r\n") == text for i, text in enumerate(old))
+        ]
+        if not candidates:
+            raise ValueError(f"hunk {number} (line {old_start}) does not match the file")
+        pos = min(candidates, key=lambda p: abs(p - expected))
+        result.extend(lines[cursor:pos])
+        k = pos
+        for tag, text, has_newline in body:
+            if tag == " ":
+                result.append(lines[k])
+                k += 1
+            elif tag == "-":
+                k += 1
+                removed += 1
+            else:
+                result.append(text + (newline if has_newline else ""))
+                added += 1
+        cursor = pos + len(old)
+    result.extend(lines[cursor:])
+    return result, len(hunks), added, removed
+
+
+@mcp.tool()
+@offload
+def edit_file(file_path: str, start_line: Optional[int] = None, end_line: Optional[int] = None,
+              new_text: Optional[str] = None, diff: Optional[str] = None,
+              expected_hash: Optional[str] = None) -> str:
+    """
+    Change part of a text file without sending the whole file.
+    
+    Either replace lines start_line..end_line with new_text, or apply a
+    unified diff. To insert without replacing, set end_line to
+    start_line - 1. The file is rewritten atomically.
+    
+    Args:
+        file_path: Path to the file to edit
+        start_line: First line to replace, 1-based
+        end_line: Last line to replace, inclusive (defaults to start_line; past the
+            last line, new_text is appended)
+        new_text: Replacement text for the line range ("" deletes the lines)
+        diff: Unified diff to apply instead of a line range
+        expected_hash: Only edit if the file's current SHA-256 matches this
+        
+    Returns:
+        Success or error message, with the new SHA-256 of the file
+    """
+    try:
+        path = Path(file_path)
+        if not path.is_file():
+            return f"Error: File '{file_path}' does not exist"
+        if (diff is None) == (start_line is None):
+            return "Error: Pass either start_line/new_text or diff"
+        if diff is None and new_text is None:
+            return "Error: new_text is required with start_line"
+
+        # Hold the path from the hash check to the rename so a concurrent
+        # edit cannot slip in between and be overwritten
+        with write_locks.hold(path):
+            data = path.read_bytes()
+            actual = hashlib.sha256(data).hexdigest()
+            if expected_hash is not None and actual != expected_hash.lower():
+                return f"Error: '{file_path}' was modified (sha256 {actual}, expected {expected_hash}); re-read it and retry"
+            try:
+                text = data.decode('utf-8')
+            except UnicodeDecodeError:
+                return f"Error: '{file_path}' is not a UTF-8 text file"
+            lines = split_lines(text)
+            newline = "\r\n" if lines and lines[0].endswith("\r\n") else "\n"
+
+            if diff is not None:
+                try:
+                    lines, hunks, added, removed = apply_unified_diff(lines, diff, newline)
+                except ValueError as e:
+                    return f"Error: Diff does not apply to '{file_path}': {str(e)}"
+                summary = f"applied {hunks} hunks (+{added} -{removed} lines)"
+            else:
+                end_line = min(start_line, len(lines)) if end_line is None else end_line
+                if start_line < 1 or start_line > len(lines) + 1 or end_line < start_line - 1 or end_line > len(lines):
+                    return f"Error: Line range {start_line}-{end_line} is outside '{file_path}' ({len(lines)} lines)"
+                replacement = split_lines(new_text) if new_text else []
+                # Keep the line break that followed the replaced (or insertion) point
+                followed = end_line < len(lines) or (end_line >= start_line and lines[end_line - 1].endswith("\n"))
+                if replacement and not replacement[-1].endswith("\n") and followed:
+                    replacement[-1] += newline
+                if start_line > len(lines) and lines and not lines[-1].endswith("\n"):
+                    lines[-1] += newline
+                lines[start_line - 1:end_line] = replacement
+                if end_line < start_line:
+                    summary = f"inserted {len(replacement)} lines at line {start_line}"
+                else:
+                    summary = f"replaced lines {start_line}-{end_line} with {len(replacement)} lines"
+
+            new_data = "".join(lines).encode('utf-8')
+            atomic_write(path, new_data)
+        return f"Successfully edited '{file_path}': {summary} (sha256 {hashlib.sha256(new_data).hexdigest()})"
+    except Exception as e:
+        return f"Error editing file '{file_path}': {str(e)}"
+
+# Threads that read and stat files for the batch tools
+IO_THREADS = int(os.environ.get("MCP_IO_THREADS", str(min(32, (os.cpu_count() or 1) + 4))))
+# Most files one read_files/stat_files call handles
+BATCH_MAX_FILES = int(os.environ.get("MCP_BATCH_MAX_FILES", "200"))
+# Total content bytes one read_files call returns
+BATCH_MAX_BYTES = int(os.environ.get("MCP_BATCH_MAX_BYTES", str(4 * 1024 * 1024)))
+
+_io_pool = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="mcp-io")
+
+
+def expand_paths(paths: Optional[List[str]], pattern: Optional[str], limit: int) -> Tuple[List[str], int]:
+    """
+    Combine explicit paths and the matches of a glob, without duplicates.
+
+    The glob is consumed lazily and stops one match past `limit`, so a
+    pattern like "**/*" over a large tree does not walk all of it. Only
+    that bounded slice is sorted: when a glob has more matches than
+    `limit`, which ones are kept follows directory order.
+
+    Returns:
+        Up to `limit` paths in order, and whether more were dropped
+    """
+    candidates = list(paths or [])
+    if pattern:
+        candidates += sorted(itertools.islice(glob.iglob(pattern, recursive=True), limit + 1))
+    unique = list(dict.fromkeys(candidates))
+    return unique[:limit], len(unique) > limit
+
+
+@mcp.tool()
+@offload
+def read_files(paths: Optional[List[str]] = None, pattern: Optional[str] = None,
+               max_bytes_per_file: int = READ_PAGE_BYTES, max_total_bytes: int = BATCH_MAX_BYTES) -> str:
+    """
+    Read many files in one call.
+    
+    Files are read concurrently and returned in the order given, each in the
+    same form read_file uses. Once max_total_bytes is spent the remaining
+    files are listed as skipped; a file cut short ends with a read_file
+    cursor for the rest.
+    
+    Args:
+        paths: Paths of the files to read
+        pattern: Glob of further files to read, e.g. "src/**/*.py"
+        max_bytes_per_file: Most bytes returned from one file
+        max_total_bytes: Most bytes returned in total
+        
+    Returns:
+        The contents of each file, or the error for that file
+    """
+    try:
+        if not paths and not pattern:
+            return "Error: Pass paths, pattern or both"
+        if max_bytes_per_file < 1 or max_total_bytes < 1:
+            return "Error: max_bytes_per_file and max_total_bytes must be at least 1"
+        files, truncated = expand_paths(paths, pattern, BATCH_MAX_FILES)
+        if not files:
+            return f"No files match '{pattern}'"
+
+        # Share out the byte budget in order from the sizes, so files past it are never read
+        stats = list(_io_pool.map(lambda f: os.stat(f) if os.path.isfile(f) else None, files))
+        budgets, remaining = [], max_total_bytes
+        for st in stats:
+            budget = min(max_bytes_per_file, remaining) if st is not None else 0
+            budgets.append(budget)
+            if st is not None:
+                remaining -= min(budget, st.st_size)
+
+        def read_one(file_path: str, st: Optional[os.stat_result], budget: int) -> Tuple[str, int, str]:
+            """Returns the text, the bytes read and one of "read", "skipped" or "failed"."""
+            if st is None:
+                if not os.path.exists(file_path):
+                    return f"Error: File '{file_path}' does not exist", 0, "failed"
+                return f"Error: '{file_path}' is not a file", 0, "failed"
+            if budget <= 0 and st.st_size > 0:
+                return f"[Skipped '{file_path}': total size budget of {max_total_bytes} bytes used up]", 0, "skipped"
+            try:
+                page, content = read_range(Path(file_path), length=budget)
+            except Exception as e:
+                return f"Error reading file '{file_path}': {str(e)}", 0, "failed"
+            if page["end"] < page["size"]:
+                page["next_cursor"] = f"{page['end']}:{page['size']}"
+            return format_page(file_path, page, content), page["end"] - page["start"], "read"
+
+        results = list(_io_pool.map(read_one, files, stats, budgets))
+        total = sum(size for _, size, _ in results)
+        outcomes = Counter(outcome for _, _, outcome in results)
+        header = f"Read {outcomes['read']} of {len(files)} files"
+        notes = []
+        if outcomes["skipped"]:
+            notes.append(f"{outcomes['skipped']} skipped: budget exhausted")
+        if outcomes["failed"]:
+            notes.append(f"{outcomes['failed']} failed")
+        if notes:
+            header += f" ({'; '.join(notes)})"
+        header += f", {total} bytes"
+        if truncated:
+            header += f"; more files not read (limit {BATCH_MAX_FILES})"
+        return header + "\n\n" + "\n\n".join(text for text, _, _ in results)
+    except Exception as e:
+        return f"Error reading files: {str(e)}"
+
+
 @mcp.tool()
-def list_directory(directory_path: str = ".") -> str:
+@offload
+def stat_files(paths: Optional[List[str]] = None, pattern: Optional[str] = None,
+               include_hash: bool = False) -> str:
+    """
+    Get the size, type, modification time and permissions of many files in one call.
+    
+    Args:
+        paths: Paths to stat
+        pattern: Glob of further paths to stat, e.g. "logs/*.log"
+        include_hash: Also compute each file's SHA-256
+        
+    Returns:
+        One line per path, or the error for that path
+    """
+    try:
+        if not paths and not pattern:
+            return "Error: Pass paths, pattern or both"
+        files, truncated = expand_paths(paths, pattern, BATCH_MAX_FILES)
+        if not files:
+            return f"No files match '{pattern}'"
+
+        def stat_one(file_path: str) -> str:
+            try:
+                st = os.lstat(file_path)
+                modified = datetime.fromtimestamp(st.st_mtime).isoformat(timespec="seconds")
+                details = f"{st.st_size} bytes, modified {modified}, mode {stat.S_IMODE(st.st_mode):04o}"
+                if stat.S_ISDIR(st.st_mode):
+                    return f"📁 {file_path}/ ({details})"
+                if stat.S_ISLNK(st.st_mode):
+                    return f"🔗 {file_path} -> {os.readlink(file_path)} ({details})"
+                if include_hash and stat.S_ISREG(st.st_mode):
+                    details += f", sha256 {file_sha256(file_path)}"
+                return f"📄 {file_path} ({details})"
+            except OSError as e:
+                return f"❌ {file_path}: {e.strerror or str(e)}"
+
+        lines = list(_io_pool.map(stat_one, files))
+        if truncated:
+            lines.append(f"[More paths not shown (limit {BATCH_MAX_FILES})]")
+        return "\n".join(lines)
+    except Exception as e:
+        return f"Error getting file status: {str(e)}"
+
+
+# Entries returned by one list_directory page
+LIST_PAGE_SIZE = int(os.environ.get("MCP_LIST_PAGE_SIZE", "1000"))
+LIST_SORT_KEYS = ("name", "size", "mtime")
+# Seconds a size- or mtime-sorted listing is kept for its later pages
+LIST_CACHE_TTL = float(os.environ.get("MCP_LIST_CACHE_TTL", "30.0"))
+LIST_CACHE_SIZE = 8
+
+
+def entry_stat(entry: os.DirEntry) -> os.stat_result:
+    """stat() a directory entry, falling back to lstat() for broken symlinks."""
+    try:
+        return entry.stat()
+    except OSError:
+        return entry.stat(follow_symlinks=False)
+
+
+def path_key(relative: str) -> str:
+    """Sort key for a relative path that places a directory's children right after it."""
+    # "/" sorts as "\0", below every character allowed in a name, like comparing Paths
+    return relative.replace("/", "\0")
+
+
+def walk_tree(root: str, depth: int, match: Optional[Callable[[str], object]],
+              after: Optional[str] = None) -> Iterator[Tuple[str, os.DirEntry]]:
+    """
+    Walk a directory tree with os.scandir in path order.
+
+    Each directory is read and sorted on its own as the walk reaches it, so
+    entries come out in path_key() order without collecting the whole tree
+    first. Subdirectories are descended into up to `depth` levels without
+    following symlinks; unreadable subdirectories are skipped.
+
+    Args:
+        root: Directory to walk
+        depth: Levels of subdirectories to descend into
+        match: Predicate on entry names, or None to keep every entry
+        after: path_key() of the last entry already returned; entries up to
+            it are skipped, and so are subdirectories that end before it
+
+    Yields:
+        (path relative to root, DirEntry) pairs
+    """
+    def walk(directory: str, prefix: str, level: int) -> Iterator[Tuple[str, os.DirEntry]]:
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            if not prefix:
+                raise
+            return
+        for entry in entries:
+            relative = prefix + entry.name
+            key = path_key(relative)
+            if after is not None and key <= after:
+                # Of the entries already returned, only the one holding the
+                # cursor can have children left
+                descend = key == after or after.startswith(key + "\0")
+            else:
+                descend = True
+                if match is None or match(entry.name):
+                    yield relative, entry
+            if descend and level < depth and entry.is_dir(follow_symlinks=False):
+                yield from walk(entry.path, relative + "/", level + 1)
+
+    yield from walk(root, "", 0)
+
+
+# (directory, depth, pattern, sort_by) -> (built at, sorted listing)
+_listings: "OrderedDict[tuple, Tuple[float, List[Tuple[tuple, str, os.DirEntry]]]]" = OrderedDict()
+_listings_lock = threading.Lock()
+
+
+def sorted_listing(root: str, depth: int, pattern: Optional[str], sort_by: str,
+                   fresh: bool) -> List[Tuple[tuple, str, os.DirEntry]]:
+    """
+    Get a directory tree's entries sorted by size or mtime.
+
+    Every entry has to be stat()ed before the first one is known, so the
+    listing is kept for LIST_CACHE_TTL seconds and later pages are cut from
+    it rather than walking the tree again. An expired listing is rebuilt;
+    cursors hold sort keys, so pages still continue where they left off.
+
+    Args:
+        root: Directory to list
+        depth: Levels of subdirectories to descend into
+        pattern: Glob matched against entry names, or None
+        sort_by: "size" or "mtime"
+        fresh: Rebuild the listing even if a cached one has not expired
+
+    Returns:
+        (sort key, path relative to root, DirEntry) rows in sort order
+    """
+    cache_key = (os.path.abspath(root), depth, pattern, sort_by)
+    with _listings_lock:
+        cached = _listings.get(cache_key)
+    if cached and not fresh and time.monotonic() - cached[0] < LIST_CACHE_TTL:
+        return cached[1]
+
+    match = re.compile(fnmatch.translate(pattern)).match if pattern else None
+    rows = []
+    for relative, entry in walk_tree(root, depth, match):
+        st = entry_stat(entry)
+        if sort_by == "size":
+            key = (entry.is_dir(), -st.st_size, path_key(relative))
+        else:
+            key = (-st.st_mtime_ns, path_key(relative))
+        rows.append((key, relative, entry))
+    rows.sort(key=lambda row: row[0])
+    with _listings_lock:
+        _listings[cache_key] = (time.monotonic(), rows)
+        _listings.move_to_end(cache_key)
+        while len(_listings) > LIST_CACHE_SIZE:
+            _listings.popitem(last=False)
+    return rows
+
+
+def encode_list_cursor(sort_by: str, shown: int, key: Union[str, tuple]) -> str:
+    """Pack a listing's sort order, entries shown so far and last sort key into a cursor."""
+    return base64.urlsafe_b64encode(json.dumps([sort_by, shown, key]).encode()).decode()
+
+
+def decode_list_cursor(cursor: str, sort_by: str) -> Tuple[int, Union[str, tuple]]:
+    """Unpack a list_directory cursor, raising ValueError if it does not belong to sort_by."""
+    try:
+        order, shown, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except TypeError:
+        raise ValueError(cursor)
+    if order != sort_by or not isinstance(shown, int) or shown < 0:
+        raise ValueError(cursor)
+    if sort_by == "name":
+        if not isinstance(key, str):
+            raise ValueError(cursor)
+        return shown, key
+    if not isinstance(key, list) or len(key) != (3 if sort_by == "size" else 2):
+        raise ValueError(cursor)
+    return shown, tuple(key)
+
+
+@mcp.tool()
+@offload
+def list_directory(directory_path: str = ".", pattern: Optional[str] = None, depth: int = 0,
+                   sort_by: str = "name", limit: int = LIST_PAGE_SIZE, cursor: Optional[str] = None) -> str:
     """
     List the contents of a directory.
     
+    Entries are listed a page at a time; a truncated listing ends with a
+    cursor that returns the next page when passed back with the same
+    arguments.
+    
     Args:
         directory_path: Path to the directory to list (defaults to current directory)
+        pattern: Glob matched against entry names, e.g. "*.py"
+        depth: Levels of subdirectories to descend into (0 lists only the directory itself)
+        sort_by: "name" (path order), "size" (largest first) or "mtime" (newest first)
+        limit: Maximum number of entries to return
+        cursor: Continuation cursor returned by a previous truncated listing
         
     Returns:
         A formatted list of directory contents
@@ -80,27 +1020,578 @@ def list_directory(directory_path: str = ".") -> str:
         
         if not path.is_dir():
             return f"Error: '{directory_path}' is not a directory"
-            
+
+        if sort_by not in LIST_SORT_KEYS:
+            return f"Error: sort_by must be one of {', '.join(LIST_SORT_KEYS)}"
+        if depth < 0 or limit < 1:
+            return "Error: depth must not be negative and limit must be at least 1"
+        shown, after = 0, None
+        if cursor is not None:
+            try:
+                shown, after = decode_list_cursor(cursor, sort_by)
+            except ValueError:
+                return f"Error: Invalid cursor '{cursor}'"
+
+        if sort_by == "name":
+            # Stream the walk in path order and stop once the page is full;
+            # only the entries on the page are stat()ed
+            match = re.compile(fnmatch.translate(pattern)).match if pattern else None
+            walk = walk_tree(str(path), depth, match, after)
+            page = [(path_key(relative), relative, entry)
+                    for relative, entry in itertools.islice(walk, limit + 1)]
+            more = len(page) > limit
+            del page[limit:]
+            total = None
+        else:
+            listing = sorted_listing(str(path), depth, pattern, sort_by, fresh=cursor is None)
+            start = bisect.bisect_right(listing, after, key=lambda row: row[0]) if after is not None else 0
+            page = listing[start:start + limit]
+            more = start + limit < len(listing)
+            total = shown + len(listing) - start
+
+        if not page:
+            if cursor is not None:
+                return f"No more entries in '{directory_path}'"
+            if pattern:
+                return f"No entries in '{directory_path}' match '{pattern}'"
+            return f"Directory '{directory_path}' is empty"
+
         items = []
-        for item in sorted(path.iterdir()):
-            if item.is_dir():
-                items.append(f"📁 {item.name}/")
+        for _, relative, entry in page:
+            if entry.is_dir():
+                items.append(f"📁 {relative}/")
             else:
-                size = item.stat().st_size
-                items.append(f"📄 {item.name} ({size} bytes)")
-                
-        if not items:
-            return f"Directory '{directory_path}' is empty"
-            
-        return f"Contents of '{directory_path}':\n" + "\n".join(items)
+                size = entry_stat(entry).st_size
+                items.append(f"📄 {relative} ({size} bytes)")
+
+        stop = shown + len(page)
+        if cursor is None and not more:
+            return f"Contents of '{directory_path}':\n" + "\n".join(items)
+        of_total = f" of {total}" if total is not None else ""
+        text = f"Contents of '{directory_path}' (entries {shown + 1}-{stop}{of_total}):\n" + "\n".join(items)
+        if more:
+            next_cursor = encode_list_cursor(sort_by, stop, page[-1][0])
+            text += f"\n[Call list_directory with cursor=\"{next_cursor}\" for the next page]"
+        return text
     except Exception as e:
         return f"Error listing directory '{directory_path}': {str(e)}"
 
-@mcp.resource("file://{file_path}")
-def get_file_resource(file_path: str) -> str:
+# Directory tree indexed by search_files. Without MCP_INDEX_ROOT the working
+# directory is indexed on the first search only, and the index is kept in
+# memory unless MCP_INDEX_PATH is set: hosts often start servers in / or in
+# throwaway directories.
+INDEX_ROOT = os.path.abspath(os.environ.get("MCP_INDEX_ROOT") or ".")
+INDEX_PATH = os.environ.get("MCP_INDEX_PATH") or (os.path.join(
+    os.path.expanduser("~"), ".cache", "mcp_stdio_server",
+    f"index-{hashlib.sha1(INDEX_ROOT.encode()).hexdigest()[:16]}.json")
+    if os.environ.get("MCP_INDEX_ROOT") else None)
+# Seconds an index refresh is trusted before the next query re-checks the tree
+INDEX_TTL = float(os.environ.get("MCP_INDEX_TTL", "5.0"))
+# Seconds after startup before an index of MCP_INDEX_ROOT is loaded in the
+# background, so the warm-up does not compete with initialize and tools/list
+INDEX_WARMUP_DELAY = float(os.environ.get("MCP_INDEX_WARMUP_DELAY", "2.0"))
+# Seconds a changed index waits before it is saved, so bursts of refreshes
+# write the file once
+INDEX_SAVE_DELAY = 10.0
+# Directory names that are never indexed
+INDEX_EXCLUDE = frozenset(filter(None, os.environ.get(
+    "MCP_INDEX_EXCLUDE", ".git,.hg,.svn,node_modules,__pycache__,.venv,.tox").split(",")))
+# Pseudo-filesystems that are never indexed, even when they share the root's device
+INDEX_SKIP_DIRS = frozenset(["/proc", "/sys", "/dev"])
+SEARCH_TYPES = ("file", "dir", "link")
+
+
+class FileIndex:
+    """
+    Persistent index of the paths, sizes, mtimes and types under a root.
+
+    The index keeps one record per directory: the directory's st_mtime_ns
+    and its entries. Creating, deleting or renaming an entry changes the
+    directory's mtime, so a refresh only stats directories and re-scans the
+    ones whose mtime moved. The records are saved as JSON and reloaded on
+    the next start, so a restart does not walk the whole tree again.
+    Sizes and mtimes of files in unchanged directories may be stale until
+    their directory is re-scanned; search_files re-stats what it returns,
+    and every name match when it filters on size or modification time.
+
+    The walk stays on the root's filesystem and skips INDEX_SKIP_DIRS. Only
+    the first query waits for a walk: later queries answer from the current
+    rows while a stale index is refreshed on a background thread, and saves
+    are debounced onto a timer.
+    """
+
+    VERSION = 1
+
+    def __init__(self, root: str = INDEX_ROOT, index_path: Optional[str] = INDEX_PATH,
+                 ttl: float = INDEX_TTL, exclude: frozenset = INDEX_EXCLUDE):
+        self.root = root
+        self.index_path = index_path
+        self.ttl = ttl
+        self.exclude = exclude
+        self._dirs: dict = {}
+        self._rows: Optional[List[Tuple[str, str, int, int]]] = None
+        self._loaded = False
+        self._refreshed = 0.0
+        self._lock = threading.Lock()
+        # Guards the background refresh thread and the pending save timer
+        self._state_lock = threading.Lock()
+        self._refreshing = False
+        self._save_timer = None
+
+    def _load(self) -> None:
+        self._loaded = True
+        if self.index_path is None:
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == self.VERSION and data.get("root") == self.root:
+            self._dirs = data["dirs"]
+
+    def _schedule_save(self) -> None:
+        if self.index_path is None:
+            return
+        with self._state_lock:
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(INDEX_SAVE_DELAY, self._save)
+                self._save_timer.name, self._save_timer.daemon = "file-index-save", True
+                self._save_timer.start()
+
+    def _save(self) -> None:
+        with self._state_lock:
+            self._save_timer = None
+        # Records are replaced on refresh, never mutated, so no lock is needed
+        data = {"version": self.VERSION, "root": self.root, "dirs": self._dirs}
+        tmp = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, self.index_path)
+        except OSError:
+            # The in-memory index still works; it is just rebuilt next start
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def _scan_dir(self, directory: str) -> list:
+        entries = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name in self.exclude:
+                    continue
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if entry.is_symlink():
+                    kind = "link"
+                elif entry.is_dir(follow_symlinks=False):
+                    kind = "dir"
+                else:
+                    kind = "file"
+                entries.append([entry.name, kind, st.st_size, st.st_mtime_ns])
+        return entries
+
+    def refresh(self) -> bool:
+        """
+        Bring the index up to date with the tree.
+
+        Returns:
+            Whether anything changed since the last refresh
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            old, new = self._dirs, {}
+            changed = False
+            try:
+                root_dev = os.stat(self.root).st_dev
+            except OSError:
+                root_dev = None
+            stack = [""]
+            while stack:
+                relative = stack.pop()
+                directory = os.path.join(self.root, relative)
+                if relative and directory in INDEX_SKIP_DIRS:
+                    continue
+                try:
+                    st = os.stat(directory)
+                    if st.st_dev != root_dev:
+                        # A mount point; stay on the root's filesystem
+                        continue
+                    mtime_ns = st.st_mtime_ns
+                    record = old.get(relative)
+                    if record is None or record[0] != mtime_ns:
+                        record = [mtime_ns, self._scan_dir(directory)]
+                        changed = True
+                except OSError:
+                    changed = True
+                    continue
+                new[relative] = record
+                for name, kind, _, _ in record[1]:
+                    if kind == "dir":
+                        stack.append(f"{relative}/{name}" if relative else name)
+            changed = changed or len(new) != len(old)
+            self._dirs = new
+            self._refreshed = time.monotonic()
+            if changed or self._rows is None:
+                self._rows = [
+                    (f"{relative}/{name}" if relative else name, kind, size, mtime_ns)
+                    for relative, (_, entries) in new.items()
+                    for name, kind, size, mtime_ns in entries
+                ]
+            if changed:
+                self._schedule_save()
+            return changed
+
+    def _refresh_in_background(self) -> None:
+        with self._state_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception:
+                pass
+            finally:
+                with self._state_lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name="file-index", daemon=True).start()
+
+    def rows(self) -> List[Tuple[str, str, int, int]]:
+        """
+        Get every indexed (relative path, type, size, mtime_ns).
+
+        Only the first call waits for the tree to be walked; once the index
+        is older than the TTL, the current rows are returned and a refresh
+        starts in the background.
+        """
+        if self._rows is None:
+            self.refresh()
+        elif time.monotonic() - self._refreshed >= self.ttl:
+            self._refresh_in_background()
+        return self._rows
+
+    def age(self) -> float:
+        """Seconds since the last refresh."""
+        return time.monotonic() - self._refreshed
+
+
+file_index = FileIndex()
+
+
+def parse_timestamp(value: str) -> int:
+    """Parse an ISO 8601 date or date-time (local time if no zone) into nanoseconds."""
+    return int(datetime.fromisoformat(value).timestamp() * 1_000_000_000)
+
+
+@mcp.tool()
+@offload
+def search_files(pattern: Optional[str] = None, file_type: Optional[str] = None,
+                 min_size: Optional[int] = None, max_size: Optional[int] = None,
+                 modified_after: Optional[str] = None, modified_before: Optional[str] = None,
+                 limit: int = 100) -> str:
+    """
+    Find files under the indexed root (MCP_INDEX_ROOT) without walking the tree.
+    
+    Args:
+        pattern: Glob matched against names, or against the relative path if it contains "/"
+        file_type: Only return "file", "dir" or "link" entries
+        min_size: Minimum size in bytes
+        max_size: Maximum size in bytes
+        modified_after: Only entries modified after this ISO date/time, e.g. "2024-05-01"
+        modified_before: Only entries modified before this ISO date/time
+        limit: Maximum number of results
+        
+    Returns:
+        Matching paths relative to the root, with size and modification time
+    """
+    try:
+        if file_type is not None and file_type not in SEARCH_TYPES:
+            return f"Error: file_type must be one of {', '.join(SEARCH_TYPES)}"
+        if limit < 1:
+            return "Error: limit must be at least 1"
+        try:
+            after_ns = parse_timestamp(modified_after) if modified_after else None
+            before_ns = parse_timestamp(modified_before) if modified_before else None
+        except ValueError as e:
+            return f"Error: Invalid date: {str(e)}"
+
+        match = re.compile(fnmatch.translate(pattern)).match if pattern else None
+        on_path = pattern is not None and "/" in pattern
+
+        def named(relative: str, kind: str) -> bool:
+            return ((file_type is None or kind == file_type)
+                    and (match is None or match(relative if on_path else relative.rpartition("/")[2])))
+
+        def sized(size: int, mtime_ns: int) -> bool:
+            return ((min_size is None or size >= min_size)
+                    and (max_size is None or size <= max_size)
+                    and (after_ns is None or mtime_ns > after_ns)
+                    and (before_ns is None or mtime_ns < before_ns))
+
+        # A file changed in place keeps its old size and mtime in the index
+        # until its directory is re-scanned, so size and date filters are
+        # applied to a fresh lstat of every row that matches on name and type
+        restat_all = any(value is not None for value in (min_size, max_size, after_ns, before_ns))
+        results, total = [], 0
+        for relative, kind, size, mtime_ns in file_index.rows():
+            if not named(relative, kind):
+                continue
+            if restat_all or len(results) < limit:
+                try:
+                    st = os.lstat(os.path.join(file_index.root, relative))
+                except OSError:
+                    continue
+                size, mtime_ns = st.st_size, st.st_mtime_ns
+                if not sized(size, mtime_ns):
+                    continue
+            if len(results) < limit:
+                results.append((relative, kind, size, mtime_ns))
+            total += 1
+
+        if not results:
+            return f"No files under '{file_index.root}' match the search"
+        lines = []
+        for relative, kind, size, mtime_ns in results:
+            modified = datetime.fromtimestamp(mtime_ns / 1_000_000_000).isoformat(timespec="seconds")
+            if kind == "dir":
+                lines.append(f"📁 {relative}/ (modified {modified})")
+            else:
+                icon = "🔗" if kind == "link" else "📄"
+                lines.append(f"{icon} {relative} ({size} bytes, modified {modified})")
+        text = f"Found {total} matches under '{file_index.root}':\n" + "\n".join(lines)
+        if total > len(results):
+            text += f"\n[{total - len(results)} more not shown; narrow the search or raise limit]"
+        return text
+    except Exception as e:
+        return f"Error searching files: {str(e)}"
+
+
+# Threads that search files for search_content
+SEARCH_WORKERS = int(os.environ.get("MCP_SEARCH_WORKERS", str(min(8, os.cpu_count() or 1))))
+# Longest line shown in search results; longer lines are cut
+SEARCH_LINE_CHARS = 300
+
+_search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="mcp-search")
+
+
+def compile_globs(globs: Optional[List[str]]) -> Optional[Callable[[str, str], bool]]:
+    """
+    Build a predicate that tells whether an entry matches any of the globs.
+
+    Globs containing "/" are matched against the relative path, others
+    against the entry name.
+    """
+    if not globs:
+        return None
+    by_name = [re.compile(fnmatch.translate(g)).match for g in globs if "/" not in g]
+    by_path = [re.compile(fnmatch.translate(g)).match for g in globs if "/" in g]
+    return lambda name, relative: (any(m(name) for m in by_name) or any(m(relative) for m in by_path))
+
+
+def walk_files(root: str, include, exclude) -> List[Tuple[str, str]]:
+    """
+    List the files under root in path order, pruning excluded directories.
+
+    Returns:
+        (absolute path, path relative to root) pairs
+    """
+    files = []
+    stack = [(root, "")]
+    while stack:
+        directory, prefix = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            relative = prefix + entry.name
+            if entry.name in INDEX_EXCLUDE or (exclude and exclude(entry.name, relative)):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                stack.append((entry.path, relative + "/"))
+            elif entry.is_file() and (include is None or include(entry.name, relative)):
+                files.append((entry.path, relative))
+    files.sort(key=lambda item: item[1].replace("/", "\0"))
+    return files
+
+
+def search_file(path: str, regex: "re.Pattern", context: int, max_matches: int,
+                stop: threading.Event) -> Optional[List[Tuple[int, bool, bytes]]]:
+    """
+    Search one file through mmap.
+
+    The regex runs over the whole buffer; line numbers and context lines are
+    only worked out around matches, and each line is reported once.
+
+    Returns:
+        (line number, is match, line) tuples in line order, an empty list
+        if nothing matched, or None for files that are binary or unreadable
+    """
+    if stop.is_set():
+        return []
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                if is_binary(buf):
+                    return None
+                lines = {}
+                line_no, counted = 1, 0
+                found = 0
+                match = regex.search(buf)
+                while match is not None and found < max_matches:
+                    start = buf.rfind(b"\n", 0, match.start()) + 1
+                    end = buf.find(b"\n", match.start())
+                    end = len(buf) if end < 0 else end
+                    # mmap has no count(); the slices add up to one copy of the file at most
+                    line_no += buf[counted:start].count(b"\n")
+                    counted = start
+                    lines[line_no] = (True, buf[start:end])
+                    found += 1
+                    before_end, number = start - 1, line_no
+                    for _ in range(context):
+                        if before_end < 0:
+                            break
+                        before_start = buf.rfind(b"\n", 0, before_end) + 1
+                        number -= 1
+                        lines.setdefault(number, (False, buf[before_start:before_end]))
+                        before_end = before_start - 1
+                    after_start, number = end + 1, line_no
+                    for _ in range(context):
+                        if after_start > len(buf) or (after_start == len(buf) and buf[-1:] == b"\n"):
+                            break
+                        after_end = buf.find(b"\n", after_start)
+                        after_end = len(buf) if after_end < 0 else after_end
+                        number += 1
+                        lines.setdefault(number, (False, buf[after_start:after_end]))
+                        after_start = after_end + 1
+                    if end >= len(buf):
+                        break
+                    match = regex.search(buf, end + 1)
+    except (OSError, ValueError):
+        return None
+    return [(number, is_match, text) for number, (is_match, text) in sorted(lines.items())]
+
+
+def search_batch(paths: List[str], regex: "re.Pattern", context: int, max_matches: int,
+                 stop: threading.Event) -> List[Optional[List[Tuple[int, bool, bytes]]]]:
+    """Run search_file over a batch of files; batching keeps pool overhead per file low."""
+    return [search_file(path, regex, context, max_matches, stop) for path in paths]
+
+
+@mcp.tool()
+@offload
+def search_content(pattern: str, directory_path: str = ".", literal: bool = False,
+                   ignore_case: bool = False, include: Optional[List[str]] = None,
+                   exclude: Optional[List[str]] = None, context_lines: int = 0,
+                   max_per_file: int = 20, max_results: int = 200) -> str:
+    """
+    Search file contents under a directory for a regex or literal string.
+    
+    Files are searched in parallel; binary files and VCS/dependency
+    directories are skipped. Results are in path order.
+    
+    Args:
+        pattern: Regular expression (or literal text with literal=True)
+        directory_path: Directory to search (defaults to current directory)
+        literal: Treat pattern as plain text
+        ignore_case: Match case-insensitively
+        include: Only search files matching one of these globs, e.g. ["*.py"]
+        exclude: Skip files and directories matching one of these globs
+        context_lines: Lines of context to show around each match
+        max_per_file: Maximum matching lines reported per file
+        max_results: Maximum matching lines reported in total
+        
+    Returns:
+        Matches as "path:line:text", context as "path-line-text"
+    """
+    try:
+        path = Path(directory_path)
+        if not path.is_dir():
+            return f"Error: Directory '{directory_path}' does not exist"
+        if not pattern:
+            return "Error: pattern must not be empty"
+        if context_lines < 0 or max_per_file < 1 or max_results < 1:
+            return "Error: context_lines must not be negative and the limits must be at least 1"
+        try:
+            regex = re.compile((re.escape(pattern) if literal else pattern).encode("utf-8"),
+                               re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+        except re.error as e:
+            return f"Error: Invalid regex '{pattern}': {str(e)}"
+
+        files = walk_files(str(path), compile_globs(include), compile_globs(exclude))
+        stop = threading.Event()
+        batch = max(1, min(256, len(files) // (SEARCH_WORKERS * 4)))
+        futures = [_search_pool.submit(search_batch, [full for full, _ in files[i:i + batch]],
+                                       regex, context_lines, max_per_file, stop)
+                   for i in range(0, len(files), batch)]
+
+        def results():
+            for future in futures:
+                yield from future.result()
+
+        output, matched_files, total, skipped = [], 0, 0, 0
+        try:
+            for (_, relative), lines in zip(files, results()):
+                if lines is None:
+                    skipped += 1
+                    continue
+                if not lines or total >= max_results:
+                    continue
+                matched_files += 1
+                previous = None
+                for number, is_match, text in lines:
+                    if is_match:
+                        if total >= max_results:
+                            break
+                        total += 1
+                    if previous is not None and context_lines and number > previous + 1:
+                        output.append("--")
+                    line = text.decode("utf-8", errors="replace")
+                    if len(line) > SEARCH_LINE_CHARS:
+                        line = line[:SEARCH_LINE_CHARS] + "…"
+                    output.append(f"{relative}{':' if is_match else '-'}{number}{':' if is_match else '-'}{line}")
+                    previous = number
+                if total >= max_results:
+                    stop.set()
+        finally:
+            stop.set()
+            for future in futures:
+                future.cancel()
+
+        summary = f"{len(files)} files searched, {skipped} binary or unreadable skipped"
+        if not total:
+            return f"No matches for '{pattern}' under '{directory_path}' ({summary})"
+        text = f"Found {total} matching lines in {matched_files} files under '{directory_path}' ({summary}):\n" + "\n".join(output)
+        if total >= max_results:
+            text += f"\n[Stopped at max_results={max_results}]"
+        return text
+    except Exception as e:
+        return f"Error searching content: {str(e)}"
+
+
+@mcp.resource("file://{file_path*}")
+@offload
+def get_file_resource(file_path: str) -> Union[str, bytes]:
     """
     Get file contents as a resource.
     
+    Binary files are returned as a blob. Text files larger than
+    MCP_READ_PAGE_BYTES return their first page; use read_file to page on.
+    Binary files that large are refused rather than cut short, since a
+    partial blob looks like a complete, corrupt file.
+    
     Args:
         file_path: Path to the file
         
@@ -111,12 +1602,196 @@ def get_file_resource(file_path: str) -> str:
         path = Path(file_path)
         if not path.exists() or not path.is_file():
             return f"File '{file_path}' not found or is not a file"
-            
-        with open(path, 'r', encoding='utf-8') as f:
-            return f.read()
+
+        page, content = read_range(path)
+        if page["next_cursor"] and page["binary"]:
+            return (f"Error: '{file_path}' is a binary file of {page['size']} bytes, more than one resource read "
+                    f"returns ({READ_PAGE_BYTES}); use read_file, which pages through it with a cursor")
+        if page["next_cursor"]:
+            content += f"\n[Truncated at byte {page['end']} of {page['size']}; use read_file with cursor=\"{page['next_cursor']}\" to continue]"
+        return content
     except Exception as e:
         return f"Error reading file: {str(e)}"
 
+
+@mcp._mcp_server.read_resource()
+async def read_resource(uri) -> List[ReadResourceContents]:
+    # A template has one mimeType for every URI it matches, so file://
+    # blobs would be labelled text/plain; type them by extension instead
+    contents = await mcp._mcp_read_resource(uri)
+    if urllib.parse.urlsplit(str(uri)).scheme != "file":
+        return contents
+    mime_type = mimetypes.guess_type(uri_to_path(uri))[0] or "application/octet-stream"
+    return [ReadResourceContents(content=item.content, mime_type=mime_type)
+            if isinstance(item.content, bytes) else item for item in contents]
+
+# Seconds between checks of subscribed files for changes
+WATCH_INTERVAL = float(os.environ.get("MCP_WATCH_INTERVAL", "1.0"))
+
+# (path, st_mtime_ns, st_size, st_ino) -> SHA-256 of recently hashed files
+_hashes: "OrderedDict[Tuple[str, int, int, int], str]" = OrderedDict()
+_hashes_lock = threading.Lock()
+
+
+class Fingerprint(NamedTuple):
+    """Identity of a file's contents at one point in time."""
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+def fingerprint(path: Union[str, Path]) -> Fingerprint:
+    """
+    Get a file's size, mtime and SHA-256.
+
+    The hash is only recomputed when the file's mtime, size or inode
+    changed since it was last hashed, so checking an unchanged file costs
+    one stat.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size, st.st_ino)
+    with _hashes_lock:
+        digest = _hashes.get(key)
+    if digest is None:
+        digest = file_sha256(path)
+        with _hashes_lock:
+            _hashes[key] = digest
+            while len(_hashes) > 4096:
+                _hashes.popitem(last=False)
+    return Fingerprint(st.st_size, st.st_mtime_ns, digest)
+
+
+def uri_to_path(uri: str) -> str:
+    """Map a file:// URI to a local path the way the file:// template does."""
+    parsed = urllib.parse.urlsplit(str(uri))
+    if parsed.scheme != "file":
+        raise ValueError(f"Only file:// resources can be subscribed to, not '{uri}'")
+    return urllib.parse.unquote(parsed.netloc + parsed.path)
+
+
+class FileWatcher:
+    """
+    Polls subscribed files and sends resources/updated when they change.
+
+    Runs as a task on the server's event loop while there are
+    subscriptions; stats and hashing happen on the I/O thread pool. A
+    notification carries the new fingerprint in its _meta, so clients can
+    skip the read when they already have that content.
+    """
+
+    def __init__(self, interval: float = WATCH_INTERVAL):
+        self.interval = interval
+        # uri -> (path, subscribed sessions, last fingerprint or None if missing)
+        self._watched: dict = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _check(path: str) -> Optional[Fingerprint]:
+        try:
+            return fingerprint(path)
+        except OSError:
+            return None
+
+    async def subscribe(self, uri: str, session) -> None:
+        """Start sending updates of uri to session."""
+        path = uri_to_path(uri)
+        loop = asyncio.get_running_loop()
+        if uri not in self._watched:
+            current = await loop.run_in_executor(_io_pool, self._check, path)
+            self._watched[uri] = (path, set(), current)
+        self._watched[uri][1].add(session)
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+
+    async def unsubscribe(self, uri: str, session) -> None:
+        """Stop sending updates of uri to session."""
+        watched = self._watched.get(uri)
+        if watched is None:
+            return
+        watched[1].discard(session)
+        if not watched[1]:
+            del self._watched[uri]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._watched:
+            await asyncio.sleep(self.interval)
+            for uri, (path, sessions, previous) in list(self._watched.items()):
+                current = await loop.run_in_executor(_io_pool, self._check, path)
+                if uri not in self._watched:
+                    continue
+                self._watched[uri] = (path, sessions, current)
+                # A touch or rewrite with identical bytes is not an update
+                if (current and current.sha256) == (previous and previous.sha256):
+                    continue
+                meta = current._asdict() if current is not None else {"deleted": True}
+                notification = types.ServerNotification(types.ResourceUpdatedNotification(
+                    method="notifications/resources/updated",
+                    params=types.ResourceUpdatedNotificationParams(uri=uri, _meta=meta),
+                ))
+                for session in list(sessions):
+                    try:
+                        await session.send_notification(notification)
+                    except Exception:
+                        # The client went away; forget its subscription
+                        sessions.discard(session)
+
+
+file_watcher = FileWatcher()
+
+
+@mcp._mcp_server.subscribe_resource()
+async def subscribe_resource(uri) -> None:
+    await file_watcher.subscribe(str(uri), mcp._mcp_server.request_context.session)
+
+
+@mcp._mcp_server.unsubscribe_resource()
+async def unsubscribe_resource(uri) -> None:
+    await file_watcher.unsubscribe(str(uri), mcp._mcp_server.request_context.session)
+
+
+_get_capabilities = mcp._mcp_server.get_capabilities
+
+
+def get_capabilities(*args, **kwargs) -> types.ServerCapabilities:
+    # The SDK always advertises subscribe=False; this server supports it
+    capabilities = _get_capabilities(*args, **kwargs)
+    if capabilities.resources is not None:
+        capabilities.resources.subscribe = True
+    return capabilities
+
+
+mcp._mcp_server.get_capabilities = get_capabilities
+
+
+@mcp.tool()
+@offload
+def file_fingerprint(file_path: str) -> str:
+    """
+    Get a cheap fingerprint of a file to tell whether it changed.
+    
+    The SHA-256 is cached per (mtime, size, inode), so repeated calls for an
+    unchanged file do not read it again. Compare the hash with the one from
+    write_file, edit_file or a resources/updated notification before
+    fetching the content.
+    
+    Args:
+        file_path: Path to the file
+        
+    Returns:
+        The file's size, modification time and SHA-256
+    """
+    try:
+        path = Path(file_path)
+        if not path.is_file():
+            return f"Error: File '{file_path}' does not exist"
+        size, mtime_ns, digest = fingerprint(path)
+        modified = datetime.fromtimestamp(mtime_ns / 1_000_000_000).isoformat(timespec="microseconds")
+        return f"Fingerprint of '{file_path}': {size} bytes, modified {modified} (mtime_ns {mtime_ns}), sha256 {digest}"
+    except Exception as e:
+        return f"Error fingerprinting file '{file_path}': {str(e)}"
+
 @mcp.prompt()
 def file_analysis_prompt(file_path: str, analysis_type: str = "summary") -> str:
     """
@@ -137,6 +1812,40 @@ def file_analysis_prompt(file_path: str, analysis_type: str = "summary") -> str:
     
     return analysis_prompts.get(analysis_type, analysis_prompts["summary"])
 
+@mcp.resource("server://metrics")
+def get_server_metrics() -> str:
+    """
+    Get per-tool and per-resource metrics of this server.
+    
+    Returns:
+        Latency, response size, in-flight and error metrics, and the
+        content cache counters, in the Prometheus text format
+    """
+    return REGISTRY.render() + content_cache.render()
+
+@mcp.resource("server://profile")
+def get_server_profile() -> str:
+    """
+    Get the stacks collected by the sampling profiler.
+    
+    Start or stop the profiler with MCP_PROFILE=1 or kill -USR2 <pid>.
+    
+    Returns:
+        Sampled stacks in collapsed-stack format, most frequent first
+    """
+    return profiler.folded()
+
+# Time every tool and resource handler registered above
+instrument(mcp)
+install_profiler_toggle()
+
 if __name__ == "__main__":
-    # Run the server with stdio transport (default)
-    mcp.run()
+    # Load or build the index of an explicitly configured root once the
+    # client is connected; otherwise the first search_files call builds it
+    if os.environ.get("MCP_INDEX_ROOT"):
+        warmup = threading.Timer(INDEX_WARMUP_DELAY, file_index.refresh)
+        warmup.name, warmup.daemon = "file-index", True
+        warmup.start()
+    # Run the server with stdio transport (default); hosts that spawn the
+    # server never show stderr, so only draw the banner for a terminal
+    mcp.run(show_banner=sys.stderr.isatty())
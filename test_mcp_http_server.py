@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared memory snapshot of the HTTP server
+"""
+
+import struct
+import time
+
+import pytest
+
+from mcp_http_server import (
+    CpuFreqReading,
+    DiskReading,
+    MemoryReading,
+    MetricsHistory,
+    NET_RATES,
+    SharedSnapshot,
+    shell_operators,
+)
+
+
+@pytest.fixture
+def snapshot():
+    shared = SharedSnapshot.create(max_processes=2, max_interfaces=2, history_size=8)
+    yield shared
+    shared.close()
+    shared.unlink()
+
+
+def process_row(pid, cpu, name):
+    return {
+        "pid": pid, "create_time": 1700000000.5 + pid, "cpu_percent": cpu, "memory_percent": 1.25,
+        "rss": 4096 * pid, "io_rate": 10.0, "status": "sleeping", "name": name,
+    }
+
+
+def test_system_round_trip(snapshot):
+    groups = SharedSnapshot.GROUPS
+    snapshot.publish(snap={
+        "cpu": 12.5,
+        "cpu_freq": CpuFreqReading(2400.0),
+        "memory": MemoryReading(8 << 30, 4 << 30, 3 << 30, 37.5),
+        "disk": DiskReading(100 << 30, 40 << 30, 60 << 30, 40.0),
+        "net_io": {"eth0": dict.fromkeys(NET_RATES, 1.5), "lo": dict.fromkeys(NET_RATES, 0.0)},
+        "ages": dict.fromkeys(groups, 0.0),
+    })
+    system = snapshot.system()
+    assert system["cpu"] == 12.5
+    assert system["cpu_freq"] == CpuFreqReading(2400.0)
+    assert system["memory"] == MemoryReading(8 << 30, 4 << 30, 3 << 30, 37.5)
+    assert system["disk"] == DiskReading(100 << 30, 40 << 30, 60 << 30, 40.0)
+    assert system["net_io"] == {"eth0": dict.fromkeys(NET_RATES, 1.5), "lo": dict.fromkeys(NET_RATES, 0.0)}
+    assert set(system["ages"]) == set(groups)
+
+
+def test_missing_cpu_freq_round_trips_as_none(snapshot):
+    snapshot.publish(snap={"cpu": 1.0, "cpu_freq": None, "ages": {"cpu": 0.0, "cpu_freq": 0.0}})
+    system = snapshot.system()
+    assert system["cpu_freq"] is None
+    assert set(system) >= {"cpu", "cpu_freq", "ages", "timestamp"}
+
+
+def test_processes_round_trip_keeps_busiest(snapshot):
+    rows = [process_row(1, 5.0, "init"), process_row(2, 50.0, "python"), process_row(3, 20.0, "x" * 80)]
+    snapshot.publish(processes=rows)
+    published, keys, total, scanned = snapshot.processes()
+    assert total == 3
+    assert scanned > 0
+    assert [row["pid"] for row in published] == [2, 3]
+    assert published[0] == {key: rows[1][key] for key in published[0]}
+    # Names are cut to the 64 bytes the layout holds
+    assert published[1]["name"] == "x" * 64
+    assert keys == {2: (2, rows[1]["create_time"]), 3: (3, rows[2]["create_time"])}
+
+
+def test_sections_left_out_keep_their_contents(snapshot):
+    connections = {"total": 3, "tcp": 2, "udp": 1, "tcp_states": {"LISTEN": 1, "ESTABLISHED": 1}}
+    snapshot.publish(processes=[process_row(1, 5.0, "init")], connections=connections)
+    snapshot.publish(snap={"cpu": 3.0, "ages": {"cpu": 0.0}})
+    assert snapshot.connections() == connections
+    assert [row["pid"] for row in snapshot.processes()[0]] == [1]
+
+
+def test_attached_reader_sees_writer(snapshot):
+    reader = SharedSnapshot.attach(snapshot.name)
+    try:
+        assert (reader.max_processes, reader.max_interfaces) == (2, 2)
+        snapshot.publish(connections={"total": 1, "tcp": 1, "udp": 0, "tcp_states": {"LISTEN": 1}})
+        assert reader.connections()["tcp_states"] == {"LISTEN": 1}
+        reader.want("processes")
+        assert snapshot.wanted("processes") > 0
+        assert snapshot.wanted("connections") == 0
+    finally:
+        reader.close()
+
+
+def test_publish_leaves_sequence_even(snapshot):
+    snapshot.publish(snap={"cpu": 1.0, "ages": {"cpu": 0.0}})
+    snapshot.publish(processes=[])
+    assert snapshot._seq() == 4
+
+
+def test_read_retries_when_sequence_moves(snapshot):
+    calls = []
+
+    def unpack():
+        calls.append(snapshot._seq())
+        if len(calls) == 1:
+            # The writer publishes while this read is in progress
+            snapshot.publish(processes=[])
+        return len(calls)
+
+    assert snapshot._read(unpack) == 2
+    assert calls == [0, 2]
+
+
+def test_read_gives_up_while_writer_is_stuck(snapshot):
+    struct.pack_into("<Q", snapshot._buf, SharedSnapshot.SEQ_OFFSET, 1)
+    with pytest.raises(RuntimeError, match="stuck"):
+        snapshot.connections()
+    struct.pack_into("<Q", snapshot._buf, SharedSnapshot.SEQ_OFFSET, 2)
+
+
+def test_attach_rejects_other_layout_version(snapshot):
+    header = list(SharedSnapshot.HEADER.unpack_from(snapshot._buf))
+    header[1] = SharedSnapshot.VERSION + 1
+    SharedSnapshot.HEADER.pack_into(snapshot._buf, 0, *header)
+    with pytest.raises(ValueError, match="unknown layout"):
+        SharedSnapshot.attach(snapshot.name)
+
+
+def test_size_matches_layout():
+    size = SharedSnapshot.size(max_processes=3, max_interfaces=1, history_size=4)
+    shared = SharedSnapshot.create(max_processes=3, max_interfaces=1, history_size=4)
+    try:
+        assert shared._shm.size >= size
+        assert shared.history.size == 4
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def shared_history(size=4):
+    """A writer and a reader MetricsHistory over one buffer, like collector and worker."""
+    buffer = bytearray(MetricsHistory.nbytes(size))
+    return MetricsHistory(size, buffer), MetricsHistory(size, buffer)
+
+
+def test_history_query_retries_write_during_read():
+    writer, reader = shared_history()
+    now = time.time()
+    writer.append(now - 2, dict.fromkeys(MetricsHistory.FIELDS, 1.0))
+
+    class WriteOnFirstRead:
+        """Timestamps column that lets the writer overwrite a slot mid-query."""
+
+        def __init__(self, column):
+            self.column, self.reads = column, 0
+
+        def __getitem__(self, slot):
+            self.reads += 1
+            if self.reads == 1:
+                writer.append(now - 1, dict.fromkeys(MetricsHistory.FIELDS, 2.0))
+            return self.column[slot]
+
+    reader._timestamps = WriteOnFirstRead(reader._timestamps)
+    result = reader.query(window=60, points=60, fields=["cpu"])
+    # The first copy was discarded; the retry sees both samples whole
+    assert result["samples"] == [1, 1]
+    assert result["cpu"]["max"] == [1.0, 2.0]
+
+
+def test_history_query_gives_up_while_writer_is_stuck():
+    writer, reader = shared_history()
+    writer._header[2] = 1
+    with pytest.raises(RuntimeError, match="stuck"):
+        reader.query(window=60)
+
+
+@pytest.mark.parametrize("command, operators", [
+    ("grep '|' README.md", []),
+    ('grep "a;b" notes.txt', []),
+    ("ls | wc", ["|"]),
+    ("ls a|b", ["|"]),
+    ("ls>out", [">"]),
+    ("ls /tmp 2>&1", [">&"]),
+    ("ls a&&ls b", ["&&"]),
+])
+def test_only_unquoted_shell_operators_are_found(command, operators):
+    assert shell_operators(command) == operators
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for the handler metrics shared by the MCP servers
+"""
+
+import re
+import subprocess
+import sys
+
+import mcp_metrics
+from mcp_metrics import MetricsRegistry
+
+
+def sample(text, metric, name):
+    match = re.search(rf'^{metric}\{{[^}}]*name="{name}"[^}}]*\}} (\S+)$', text, re.M)
+    return float(match.group(1)) if match else None
+
+
+def worker_registry(monkeypatch, directory, pid):
+    """A registry that shares its metrics as if it ran in process pid."""
+    monkeypatch.setattr(mcp_metrics.os, "getpid", lambda: pid)
+    registry = MetricsRegistry()
+    registry.server = "Test"
+    registry.register("tool", "work")
+    registry.share(str(directory))
+    return registry
+
+
+def dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def test_render_sums_workers(tmp_path, monkeypatch):
+    first = worker_registry(monkeypatch, tmp_path, 1)
+    second = worker_registry(monkeypatch, tmp_path, dead_pid())
+    for registry, calls in ((first, 2), (second, 3)):
+        for _ in range(calls):
+            registry.start("tool", "work")
+            registry.finish("tool", "work", 0.002, 50, error=False)
+    first.start("tool", "work")
+    second.start("tool", "work")
+    second.finish("tool", "work", 0.002, None, error=True)
+
+    monkeypatch.setattr(mcp_metrics.os, "getpid", lambda: 1)
+    text = first.render()
+    assert sample(text, "mcp_handler_duration_seconds_count", "work") == 6
+    assert sample(text, "mcp_handler_response_bytes_count", "work") == 5
+    assert sample(text, "mcp_handler_errors_total", "work") == 1
+    # The second worker has exited, so only the first one's call is in flight
+    assert sample(text, "mcp_handler_in_flight", "work") == 1
+    assert text == second.render()
+
+
+def test_share_keeps_earlier_counts(tmp_path):
+    registry = MetricsRegistry()
+    registry.register("tool", "work")
+    registry.start("tool", "work")
+    registry.finish("tool", "work", 0.5, 10, error=False)
+    before = registry.render()
+    registry.share(str(tmp_path))
+    assert registry.render() == before
+    assert [path.suffix for path in tmp_path.iterdir()] == [".metrics"]
+
+
+def test_registered_handler_is_rendered_before_first_call():
+    registry = MetricsRegistry()
+    registry.register("resource", "file://{path*}")
+    text = registry.render()
+    assert sample(text, "mcp_handler_duration_seconds_count", r"file://\{path\*\}") == 0
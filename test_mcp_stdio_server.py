@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Tests for the stdio server
+"""
+
+import asyncio
+import re
+
+import pytest
+
+import mcp_stdio_server as server
+from mcp_stdio_server import apply_unified_diff, split_lines
+
+
+def call(tool, **arguments):
+    """Run a tool body the way FastMCP would and return its text."""
+    return asyncio.run(tool.fn(**arguments))
+
+
+def test_diff_applies_at_offset():
+    lines = split_lines("".join(f"line {i}\n" for i in range(1, 21)))
+    # Header says line 3, but the context sits at line 13 after an insertion upstream
+    diff = (
+        "--- a/file.txt\n"
+        "+++ b/file.txt\n"
+        "@@ -3,3 +3,3 @@\n"
+        " line 12\n"
+        "-line 13\n"
+        "+line thirteen\n"
+        " line 14\n"
+    )
+    result, hunks, added, removed = apply_unified_diff(lines, diff, "\n")
+    assert (hunks, added, removed) == (1, 1, 1)
+    assert result[12] == "line thirteen\n"
+    assert len(result) == 20
+
+
+def test_diff_picks_match_nearest_to_header():
+    lines = split_lines("x\ny\nx\ny\nx\ny\n")
+    diff = "@@ -5,2 +5,2 @@\n x\n-y\n+z\n"
+    result, _, _, _ = apply_unified_diff(lines, diff, "\n")
+    assert "".join(result) == "x\ny\nx\ny\nx\nz\n"
+
+
+def test_diff_without_final_newline():
+    lines = split_lines("first\nlast")
+    diff = (
+        "@@ -1,2 +1,3 @@\n"
+        " first\n"
+        "-last\n"
+        "\\ No newline at end of file\n"
+        "+last\n"
+        "+appended\n"
+        "\\ No newline at end of file\n"
+    )
+    result, _, added, removed = apply_unified_diff(lines, diff, "\n")
+    assert "".join(result) == "first\nlast\nappended"
+    assert (added, removed) == (2, 1)
+
+
+def test_diff_keeps_crlf_line_endings(tmp_path):
+    path = tmp_path / "crlf.txt"
+    path.write_bytes(b"one\r\ntwo\r\nthree\r\n")
+    diff = "@@ -1,3 +1,3 @@\n one\n-two\n+TWO\n three\n"
+    text = call(server.edit_file, file_path=str(path), diff=diff)
+    assert text.startswith("Successfully edited"), text
+    assert path.read_bytes() == b"one\r\nTWO\r\nthree\r\n"
+
+
+def test_diff_that_does_not_apply(tmp_path):
+    lines = split_lines("alpha\nbeta\n")
+    with pytest.raises(ValueError, match="hunk 1"):
+        apply_unified_diff(lines, "@@ -1,2 +1,2 @@\n alpha\n-gamma\n+delta\n", "\n")
+
+    path = tmp_path / "file.txt"
+    path.write_text("alpha\nbeta\n")
+    text = call(server.edit_file, file_path=str(path), diff="@@ -1,2 +1,2 @@\n alpha\n-gamma\n+delta\n")
+    assert text.startswith("Error: Diff does not apply")
+    assert path.read_text() == "alpha\nbeta\n"
+
+
+def list_pages(**arguments):
+    """Follow list_directory cursors to the end, returning the entry lines and page count."""
+    entries, pages, cursor = [], 0, None
+    while True:
+        text = call(server.list_directory, cursor=cursor, **arguments)
+        assert not text.startswith("Error"), text
+        pages += 1
+        body = text.splitlines()[1:]
+        entries += [line for line in body if not line.startswith("[")]
+        match = re.search(r'cursor="([^"]+)"', text)
+        if not match:
+            return entries, pages
+        cursor = match.group(1)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for i in range(7):
+        (tmp_path / f"file_{i}.txt").write_text("x" * (i * 10))
+    for name in ("a", "a-b", "b"):
+        (tmp_path / name).mkdir()
+        for i in range(3):
+            (tmp_path / name / f"inner_{i}.py").write_text("y" * i)
+    return tmp_path
+
+
+@pytest.mark.parametrize("sort_by", ["name", "size", "mtime"])
+@pytest.mark.parametrize("depth", [0, 1])
+def test_list_directory_pages_match_full_listing(tree, sort_by, depth):
+    full = call(server.list_directory, directory_path=str(tree), depth=depth, sort_by=sort_by, limit=1000)
+    expected = full.splitlines()[1:]
+    entries, pages = list_pages(directory_path=str(tree), depth=depth, sort_by=sort_by, limit=3)
+    assert entries == expected
+    assert pages == -(-len(expected) // 3)
+
+
+def test_list_directory_name_order_keeps_children_after_parent(tree):
+    entries, _ = list_pages(directory_path=str(tree), depth=1, limit=2)
+    names = [line.split()[1] for line in entries]
+    assert names.index("a/") < names.index("a/inner_0.py") < names.index("a-b/")
+
+
+def test_list_directory_cursor_survives_removed_entry(tree):
+    first = call(server.list_directory, directory_path=str(tree), limit=4)
+    cursor = re.search(r'cursor="([^"]+)"', first).group(1)
+    (tree / "file_0.txt").unlink()
+    second = call(server.list_directory, directory_path=str(tree), limit=4, cursor=cursor)
+    assert "(entries 5-8)" in second.splitlines()[0]
+    assert second.splitlines()[1] == "📄 file_1.txt (10 bytes)"
+
+
+def test_list_directory_rejects_foreign_cursor(tree):
+    first = call(server.list_directory, directory_path=str(tree), limit=2)
+    cursor = re.search(r'cursor="([^"]+)"', first).group(1)
+    assert call(server.list_directory, directory_path=str(tree), sort_by="size", cursor=cursor).startswith("Error: Invalid cursor")
+    assert call(server.list_directory, directory_path=str(tree), cursor="5").startswith("Error: Invalid cursor")
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = server.ContentCache(max_bytes=1000)
+    monkeypatch.setattr(server, "content_cache", cache)
+    return cache
+
+
+def test_content_cache_hit_costs_one_stat(tmp_path, cache, monkeypatch):
+    path = tmp_path / "small.txt"
+    path.write_text("cached text\n")
+    with server.open_content(path) as (data, binary, text):
+        assert text == "cached text\n"
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    stats = []
+    real_stat = server.os.stat
+    monkeypatch.setattr(server.os, "stat", lambda *args, **kwargs: stats.append(args) or real_stat(*args, **kwargs))
+    monkeypatch.setattr("builtins.open", lambda *args, **kwargs: pytest.fail("a hit must not open the file"))
+    with server.open_content(path) as (data, binary, text):
+        assert (bytes(data), binary, text) == (b"cached text\n", False, "cached text\n")
+    assert len(stats) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_content_cache_misses_when_mtime_or_size_changes(tmp_path, cache):
+    path = tmp_path / "small.txt"
+    path.write_text("one")
+    assert server.load_content(path).data == b"one"
+
+    st = path.stat()
+    server.os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert server.load_content(path).data == b"one"
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    # Same mtime, different size
+    mtime = path.stat().st_mtime_ns
+    path.write_text("three")
+    server.os.utime(path, ns=(mtime, mtime))
+    assert server.load_content(path).data == b"three"
+    assert (cache.hits, cache.misses) == (0, 3)
+    assert server.load_content(path).data == b"three"
+    assert cache.hits == 1
+
+
+@pytest.mark.parametrize("write", [
+    lambda path: call(server.write_file, file_path=str(path), content="new content"),
+    lambda path: call(server.write_file, file_path=str(path), content=" more", mode="append"),
+    lambda path: call(server.edit_file, file_path=str(path), start_line=1, new_text="edited\n"),
+])
+def test_content_cache_drops_entry_on_write(tmp_path, cache, write):
+    path = tmp_path / "small.txt"
+    path.write_text("old content\n")
+    server.load_content(path)
+    assert len(cache._entries) == 1
+
+    assert write(path).startswith("Success")
+    assert len(cache._entries) == 0
+    assert cache.bytes == 0
+    assert server.load_content(path).data == path.read_bytes()
+
+
+def test_content_cache_evicts_least_recently_used(tmp_path, cache):
+    paths = []
+    for name in "abc":
+        path = tmp_path / f"{name}.bin"
+        # Binary content has no decoded text, so each entry costs its 400 bytes
+        path.write_bytes(b"\0" * 400)
+        paths.append(path)
+    server.load_content(paths[0])
+    server.load_content(paths[1])
+    server.load_content(paths[0])
+    server.load_content(paths[2])
+
+    assert cache.evictions == 1
+    assert cache.bytes == 800
+    assert list(cache._entries) == [str(paths[0]), str(paths[2])]
+
+    # Larger than the whole budget: never cached
+    big = tmp_path / "big.bin"
+    big.write_bytes(b"\0" * 2000)
+    server.load_content(big)
+    assert str(big) not in cache._entries
+    assert cache.evictions == 1
+
+
+def test_search_files_sees_file_changed_in_place(tmp_path, monkeypatch):
+    (tmp_path / "d").mkdir()
+    log = tmp_path / "d" / "app.log"
+    log.write_text("x")
+    index = server.FileIndex(root=str(tmp_path), index_path=None, ttl=3600)
+    monkeypatch.setattr(server, "file_index", index)
+    index.refresh()
+    since = server.datetime.fromtimestamp(log.stat().st_mtime + 1).isoformat()
+
+    # Grow the file without touching its directory, as a logger appending would
+    with open(log, "a") as f:
+        f.write("y" * 5000)
+    st = log.stat()
+    server.os.utime(log, ns=(st.st_atime_ns, st.st_mtime_ns + 5 * 10**9))
+
+    text = call(server.search_files, min_size=1000, file_type="file")
+    assert "d/app.log (5001 bytes" in text, text
+    text = call(server.search_files, modified_after=since)
+    assert "d/app.log" in text, text
+    assert "No files" in call(server.search_files, max_size=10, file_type="file")
+
+
+def test_file_resource_refuses_truncated_blob(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "READ_PAGE_BYTES", 1000)
+    small, large = tmp_path / "small.bin", tmp_path / "large.bin"
+    small.write_bytes(b"\0\1" * 100)
+    large.write_bytes(b"\0\1" * 1500)
+    assert asyncio.run(server.get_file_resource.fn(file_path=str(small))) == b"\0\1" * 100
+    text = asyncio.run(server.get_file_resource.fn(file_path=str(large)))
+    assert text.startswith("Error:") and "read_file" in text
+
+
+def test_expand_paths_stops_glob_past_limit(tmp_path, monkeypatch):
+    for i in range(10):
+        (tmp_path / f"f{i}.txt").write_text("")
+    pulled = []
+    real_iglob = server.glob.iglob
+
+    def counting_iglob(*args, **kwargs):
+        for match in real_iglob(*args, **kwargs):
+            pulled.append(match)
+            yield match
+
+    monkeypatch.setattr(server.glob, "iglob", counting_iglob)
+    files, truncated = server.expand_paths(None, str(tmp_path / "*.txt"), 3)
+    assert len(files) == 3 and files == sorted(files)
+    assert truncated
+    assert len(pulled) == 4
+
+    files, truncated = server.expand_paths([str(tmp_path / "f0.txt")], str(tmp_path / "f[0-2].txt"), 3)
+    assert files == [str(tmp_path / f"f{i}.txt") for i in range(3)]
+    assert not truncated
@@ -64,11 +64,19 @@ def show_server_details():
     print("\n🔧 STDIO SERVER (mcp_stdio_server.py)")
     print("Transport: Standard Input/Output")
     print("Tools:")
-    print("  • read_file(file_path) - Read file contents")
-    print("  • write_file(file_path, content) - Write to file")
-    print("  • list_directory(directory_path) - List directory contents")
+    print("  • read_file(file_path, offset, length, start_line, end_line, head, tail, cursor) - Read file contents or a range")
+    print("  • read_files(paths, pattern, max_bytes_per_file, max_total_bytes) - Read many files at once")
+    print("  • stat_files(paths, pattern, include_hash) - Stat many files at once")
+    print("  • write_file(file_path, content, mode, expected_hash) - Write or append to file atomically")
+    print("  • edit_file(file_path, start_line, end_line, new_text, diff, expected_hash) - Patch a file")
+    print("  • list_directory(directory_path, pattern, depth, sort_by, limit, cursor) - List directory contents")
+    print("  • search_files(pattern, file_type, min_size, max_size, modified_after, modified_before, limit) - Search the file index")
+    print("  • search_content(pattern, directory_path, literal, ignore_case, include, exclude, context_lines, ...) - Search file contents")
+    print("  • file_fingerprint(file_path) - Size, mtime and SHA-256 of a file")
     print("Resources:")
-    print("  • file://{file_path} - Access file as resource")
+    print("  • file://{file_path*} - Access file as resource (subscribable)")
+    print("  • server://metrics - Per-handler metrics (Prometheus text)")
+    print("  • server://profile - Sampling profiler stacks")
     print("Prompts:")
     print("  • file_analysis_prompt(file_path, analysis_type) - Generate file analysis prompts")
     
@@ -76,13 +84,20 @@ def show_server_details():
     print("Transport: Streamable HTTP")
     print("URL: http://localhost:8000/mcp")
     print("Tools:")
-    print("  • get_system_info() - Comprehensive system information")
-    print("  • get_running_processes(limit) - Running process information")
-    print("  • get_network_info() - Network interface information")
+    print("  • get_system_info(format, sections) - Comprehensive system information")
+    print("  • get_running_processes(limit, sort_by, format) - Top processes by cpu/memory/rss/io")
+    print("  • find_processes(name, cmdline, user, pids, ...) - Filtered process query")
+    print("  • get_process_details(pid, limit, format) - Threads, files, connections, IO of one process")
+    print("  • get_network_info(format, sections) - Network interface information")
     print("  • execute_command(command) - Safe command execution")
+    print("  • get_metrics_history(window_seconds, points, fields) - Downsampled metrics history")
     print("Resources:")
     print("  • system://info - Basic system information")
     print("  • system://stats - Current system statistics")
+    print("  • system://history - Last hour of host metrics")
+    print("Routes:")
+    print("  • GET /metrics - Per-handler metrics (Prometheus text)")
+    print("  • GET|POST /debug/profile - Sampling profiler control")
     print("Prompts:")
     print("  • system_analysis_prompt(analysis_type) - Generate system analysis prompts")
 
@@ -130,6 +145,7 @@ if __name__ == "__main__":
     
     print("\n" + "=" * 60)
     print("✅ Both servers are ready to use!")
+    print("📊 Benchmark them: python benchmark_servers.py")
     print("📚 Install dependencies: pip install -r requirements.txt")
     print("🔍 Use MCP Inspector for testing: mcp dev <server_file>")
     print("=" * 60)